@@ -1,29 +1,31 @@
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, render_template, request, jsonify, Response, stream_with_context
 from flask_cors import CORS
 from openai import OpenAI
 import os
 from datetime import datetime
 import time
-import gspread
+import traceback
 
 from mongodb_operations import mongodb_manager
-import dropbox
-from environment import load_environment, get_google_credentials, get_flask_config
+from environment import load_environment, get_google_credentials, get_flask_config, get_admin_token
 
 # RAG imports
-from chromadb_setup import initialize_chromadb
-from documents_processing_responses.document_processing import load_documents_from_directory, preprocess_documents
-from embeddings.embedding_generation import generate_embeddings
-from db_operations import upsert_documents_into_db
+from retrieval.retrieval_service import retrieval_service
+from ingestion.ingestion import sync_knowledge_base
+from ingestion.kb_watcher import KnowledgeBaseWatcher
 
 # Dropbox configuration
 from dropbox_auth import create_dropbox_client
 
 # Packages
-from chatbot.chatbot import generate_sign_nize_response
+from chatbot.chatbot import generate_sign_nize_response, stream_sign_nize_response, QUOTE_FORM_TRIGGER
+from chatbot.llm_gateway import LLMUnavailableError
+from chatbot.streaming import QuoteTriggerFilter, format_sse
 from validations.validations import validate_email
 from session_manager.session_manager import save_session_to_sheets
 from chatbot.chatbot import build_conversation_text
+from chatbot.conversation_summary import conversation_summarizer
+from chatbot.usage_tracking import usage_tracker
 from hubspot.hubspot import create_hubspot_contact, hubspot_patch_conversation
 
 # Load environment variables
@@ -32,19 +34,30 @@ openai_key = load_environment()
 # Initialize OpenAI Client
 client = OpenAI(api_key=openai_key)
 
-# Initialize ChromaDB
-collection = initialize_chromadb(openai_key)
-
-# Load and preprocess documents
-directory_path = "./data"
-documents = load_documents_from_directory(directory_path)
-chunked_documents = preprocess_documents(documents)
-
-# Generate embeddings
-chunked_documents = generate_embeddings(client, chunked_documents)
-
-# Upsert documents into ChromaDB
-upsert_documents_into_db(collection, chunked_documents)
+# With a prebuilt index artifact from build_index.py the shared collection is
+# opened read-only (at startup only if KB_WARM_UP is true, otherwise on first
+# query); with KB_REINDEX_ON_STARTUP, files changed in data/ since it was
+# built are reindexed first. Without one, open it now and sync documents into
+# it (only new or changed chunks are embedded).
+if retrieval_service.has_published_artifact():
+    if retrieval_service.config['reindex_on_startup']:
+        try:
+            retrieval_service.reindex_if_stale(client)
+        except Exception as e:
+            print(f"⚠️  Startup reindex failed, serving the previous index artifact: {e}")
+            traceback.print_exc()
+    if retrieval_service.config['warm_up']:
+        retrieval_service.warm_up()
+else:
+    collection = retrieval_service.get_collection()
+    retrieval_config = retrieval_service.config
+    sync_knowledge_base(client, collection, retrieval_config['data_dir'], retrieval_config['chroma_path'])
+
+# Hot-reload the knowledge base when files in data/ change (KB_WATCH_INTERVAL > 0)
+kb_watcher = None
+if retrieval_service.config['watch_interval'] > 0:
+    kb_watcher = KnowledgeBaseWatcher(retrieval_service, client, retrieval_service.config['watch_interval'])
+    kb_watcher.start()
 
 # Flask application setup
 app = Flask(__name__, template_folder="templates", static_folder="static")
@@ -53,6 +66,9 @@ CORS(app)
 flask_config = get_flask_config()
 app.config['SECRET_KEY'] = flask_config['FLASK_SECRET_KEY']
 
+# Shown when the model stays rate limited or unreachable after retries
+LLM_BUSY_MESSAGE = "We're handling a lot of conversations right now. Please try again in a moment."
+
 # In-memory storage for chat sessions
 chat_sessions = {}
 saved_sessions = set()
@@ -62,16 +78,8 @@ def index():
     """Serve the main chatbot page (index.html)."""
     return render_template("index.html")
 
-@app.route("/chat", methods=["POST"])
-def chat():
-    print(">>> /chat endpoint hit")
-    user_message = request.json.get("message")
-    session_id = request.json.get("session_id", "default")
-    email = request.json.get("email", "")
-    print("Message received:", user_message)
-    print("Email:", email)
-
- 
+def ensure_chat_session(session_id, email):
+    """Create the in-memory session on first contact and make sure it has a HubSpot contact"""
     if session_id not in chat_sessions:
         chat_sessions[session_id] = {
             "messages": [],
@@ -103,6 +111,107 @@ def chat():
                 print(f"⚠️  HubSpot upsert failed or no contact_id returned: {upsert_result}")
     except Exception as e:
         print(f"⚠️  Error ensuring HubSpot contact for session: {e}")
+
+def finalize_chat_turn(session_id, response, quote_form_triggered):
+    """Record the assistant reply and persist the session (Sheets, MongoDB, summary, HubSpot)"""
+    record_assistant_reply(session_id, response, quote_form_triggered)
+    persist_chat_turn(session_id, response)
+
+def record_assistant_reply(session_id, response, quote_form_triggered):
+    """Append the assistant reply to the in-memory session"""
+    if quote_form_triggered:
+        chat_sessions[session_id]["quote_state"] = "form_shown"
+
+    chat_sessions[session_id]["messages"].append({
+        "role": "assistant",
+        "content": response
+    })
+
+def persist_chat_turn(session_id, response):
+    """Save the session to Sheets and MongoDB, update the summary and sync HubSpot (blocking calls)"""
+    message_count = len(chat_sessions[session_id]["messages"])
+    
+    if chat_sessions[session_id].get("email"):
+        update_existing = session_id in saved_sessions
+        print(f"📊 Updating Google Sheets for session {session_id}: {message_count} messages, update_existing={update_existing}")
+        success = save_session_to_sheets(session_id, chat_sessions[session_id]["email"], chat_sessions[session_id]["messages"], update_existing)
+        if success and session_id not in saved_sessions:
+            saved_sessions.add(session_id)
+            print(f"✅ Session {session_id} added to saved_sessions")
+        elif success:
+            print(f"✅ Session {session_id} updated in Google Sheets")
+    else:
+        print(f"⚠️  No email available for session {session_id}, skipping Google Sheets update")
+    
+    try:
+        db_result = mongodb_manager.save_chat_session(
+            session_id, 
+            chat_sessions[session_id].get("email", ""), 
+            chat_sessions[session_id]["messages"]
+        )
+        if db_result["success"]:
+            print(f"✅ Chat session saved to database: {db_result['action']}")
+        else:
+            print(f"⚠️  Failed to save chat session to database: {db_result.get('error', 'Unknown error')}")
+    except Exception as db_error:
+        print(f"❌ Database save error: {db_error}")
+
+    # Turn usage is written only now that the session document exists
+    if usage_tracker:
+        usage_tracker.flush_session(session_id)
+
+    # Fold older turns into the rolling summary in the background
+    if conversation_summarizer:
+        conversation_summarizer.maybe_schedule(client, session_id, chat_sessions[session_id])
+    
+    print(f"Generated response for session {session_id}:", response)
+
+    try:
+        contact_id = None
+        if session_id in chat_sessions:
+            contact_id = chat_sessions[session_id].get("hubspot_contact_id")
+        if not contact_id:
+          
+            db_session = mongodb_manager.get_chat_session(session_id)
+            if db_session.get("success"):
+                contact_id = db_session["session"].get("hubspot_contact_id")
+
+        if contact_id:
+          
+            last_sync_iso = None
+            db_session = mongodb_manager.get_chat_session(session_id)
+            if db_session.get("success"):
+                last_sync_iso = db_session["session"].get("hubspot_last_sync_at")
+
+            should_sync = True
+            if last_sync_iso:
+                try:
+                    last_sync_dt = datetime.fromisoformat(last_sync_iso.replace("Z", "+00:00"))
+                 
+                    should_sync = (datetime.utcnow() - last_sync_dt).total_seconds() >= 30
+                except Exception:
+                    should_sync = True
+
+            if should_sync:
+                conv_text = build_conversation_text(chat_sessions[session_id]["messages"], session_id)
+                patch_result = hubspot_patch_conversation(contact_id, conv_text)
+                if patch_result.get("success"):
+                    mongodb_manager.update_hubspot_last_sync(session_id, datetime.utcnow().isoformat() + "Z")
+                else:
+                    print(f"⚠️  HubSpot sync skipped/failed: {patch_result.get('error')}")
+    except Exception as sync_err:
+        print(f"⚠️  HubSpot sync error: {sync_err}")
+
+@app.route("/chat", methods=["POST"])
+def chat():
+    print(">>> /chat endpoint hit")
+    user_message = request.json.get("message")
+    session_id = request.json.get("session_id", "default")
+    email = request.json.get("email", "")
+    print("Message received:", user_message)
+    print("Email:", email)
+
+    ensure_chat_session(session_id, email)
   
     chat_sessions[session_id]["messages"].append({
         "role": "user",
@@ -110,80 +219,12 @@ def chat():
     })
 
     try:
-        response = generate_sign_nize_response(client, user_message, chat_sessions[session_id])
-        quote_form_triggered = "[QUOTE_FORM_TRIGGER]" in response
+        response = generate_sign_nize_response(client, user_message, chat_sessions[session_id], session_id)
+        quote_form_triggered = QUOTE_FORM_TRIGGER in response
         if quote_form_triggered:
-            response = response.replace("[QUOTE_FORM_TRIGGER]", "")
-
-        chat_sessions[session_id]["messages"].append({
-            "role": "assistant",
-            "content": response
-        })
-        
-        message_count = len(chat_sessions[session_id]["messages"])
-        
-        if chat_sessions[session_id].get("email"):
-            update_existing = session_id in saved_sessions
-            print(f"📊 Updating Google Sheets for session {session_id}: {message_count} messages, update_existing={update_existing}")
-            success = save_session_to_sheets(session_id, chat_sessions[session_id]["email"], chat_sessions[session_id]["messages"], update_existing)
-            if success and session_id not in saved_sessions:
-                saved_sessions.add(session_id)
-                print(f"✅ Session {session_id} added to saved_sessions")
-            elif success:
-                print(f"✅ Session {session_id} updated in Google Sheets")
-        else:
-            print(f"⚠️  No email available for session {session_id}, skipping Google Sheets update")
-        
-        try:
-            db_result = mongodb_manager.save_chat_session(
-                session_id, 
-                chat_sessions[session_id].get("email", ""), 
-                chat_sessions[session_id]["messages"]
-            )
-            if db_result["success"]:
-                print(f"✅ Chat session saved to database: {db_result['action']}")
-            else:
-                print(f"⚠️  Failed to save chat session to database: {db_result.get('error', 'Unknown error')}")
-        except Exception as db_error:
-            print(f"❌ Database save error: {db_error}")
-        
-        print(f"Generated response for session {session_id}:", response)
+            response = response.replace(QUOTE_FORM_TRIGGER, "")
 
-        try:
-            contact_id = None
-            if session_id in chat_sessions:
-                contact_id = chat_sessions[session_id].get("hubspot_contact_id")
-            if not contact_id:
-              
-                db_session = mongodb_manager.get_chat_session(session_id)
-                if db_session.get("success"):
-                    contact_id = db_session["session"].get("hubspot_contact_id")
-
-            if contact_id:
-              
-                last_sync_iso = None
-                db_session = mongodb_manager.get_chat_session(session_id)
-                if db_session.get("success"):
-                    last_sync_iso = db_session["session"].get("hubspot_last_sync_at")
-
-                should_sync = True
-                if last_sync_iso:
-                    try:
-                        last_sync_dt = datetime.fromisoformat(last_sync_iso.replace("Z", "+00:00"))
-                     
-                        should_sync = (datetime.utcnow() - last_sync_dt).total_seconds() >= 30
-                    except Exception:
-                        should_sync = True
-
-                if should_sync:
-                    conv_text = build_conversation_text(chat_sessions[session_id]["messages"], session_id)
-                    patch_result = hubspot_patch_conversation(contact_id, conv_text)
-                    if patch_result.get("success"):
-                        mongodb_manager.update_hubspot_last_sync(session_id, datetime.utcnow().isoformat() + "Z")
-                    else:
-                        print(f"⚠️  HubSpot sync skipped/failed: {patch_result.get('error')}")
-        except Exception as sync_err:
-            print(f"⚠️  HubSpot sync error: {sync_err}")
+        finalize_chat_turn(session_id, response, quote_form_triggered)
         return jsonify({
             "message": response,
             "session_id": session_id,
@@ -191,10 +232,78 @@ def chat():
             "quote_form_triggered": quote_form_triggered
         })
         
+    except LLMUnavailableError as e:
+        print("LLM unavailable in generate_sign_nize_response:", str(e))
+        return jsonify({"message": LLM_BUSY_MESSAGE}), 503
     except Exception as e:
         print("Error in generate_sign_nize_response:", str(e))
         return jsonify({"message": f"Sorry, I encountered an error. Please try again."}), 500
 
+@app.route("/chat/stream", methods=["POST"])
+def chat_stream():
+    """
+    Streaming variant of /chat using server-sent events.
+
+    Sends "token" events ({"text": ...}) as the model produces them, then one
+    "done" event with the same fields /chat returns (minus the message).
+    [QUOTE_FORM_TRIGGER] is stripped even when split across chunks. Session
+    persistence runs after the stream has been closed.
+    """
+    print(">>> /chat/stream endpoint hit")
+    user_message = request.json.get("message")
+    session_id = request.json.get("session_id", "default")
+    email = request.json.get("email", "")
+    print("Message received:", user_message)
+    print("Email:", email)
+
+    ensure_chat_session(session_id, email)
+
+    chat_sessions[session_id]["messages"].append({
+        "role": "user",
+        "content": user_message
+    })
+
+    completed = {}
+
+    def generate():
+        quote_filter = QuoteTriggerFilter()
+        try:
+            for delta in stream_sign_nize_response(client, user_message, chat_sessions[session_id], session_id):
+                text = quote_filter.feed(delta)
+                if text:
+                    yield format_sse("token", {"text": text})
+            text = quote_filter.flush()
+            if text:
+                yield format_sse("token", {"text": text})
+        except LLMUnavailableError as e:
+            print("LLM unavailable in stream_sign_nize_response:", str(e))
+            yield format_sse("error", {"message": LLM_BUSY_MESSAGE})
+            return
+        except Exception as e:
+            print("Error in stream_sign_nize_response:", str(e))
+            yield format_sse("error", {"message": "Sorry, I encountered an error. Please try again."})
+            return
+
+        completed["response"] = quote_filter.text
+        completed["quote_form_triggered"] = quote_filter.triggered
+        yield format_sse("done", {
+            "session_id": session_id,
+            "message_count": len(chat_sessions[session_id]["messages"]) + 1,
+            "quote_form_triggered": quote_filter.triggered
+        })
+
+    def persist_turn():
+        # Only completed answers are stored; an aborted stream leaves just the user message
+        if "response" in completed:
+            finalize_chat_turn(session_id, completed["response"], completed["quote_form_triggered"])
+
+    stream_response = Response(stream_with_context(generate()), mimetype="text/event-stream")
+    stream_response.headers["Cache-Control"] = "no-cache"
+    # Disable proxy buffering (nginx) so tokens are delivered as they are produced
+    stream_response.headers["X-Accel-Buffering"] = "no"
+    stream_response.call_on_close(persist_turn)
+    return stream_response
+
 @app.route("/validate-email", methods=["POST"])
 def validate_email_endpoint():
     print(">>> Email validation endpoint hit")
@@ -266,6 +375,7 @@ def save_quote():
         result = mongodb_manager.save_quote_data(session_id, email, form_data)
        
         if result["success"] and session_id in chat_sessions:
+            chat_sessions[session_id]["quote_state"] = "submitted"
             try:
                 update_existing = session_id in saved_sessions
                 save_session_to_sheets(session_id, email, chat_sessions[session_id]["messages"], update_existing)
@@ -330,6 +440,7 @@ def upload_logo():
                 print("❌ Failed to create Dropbox client")
                 return jsonify({"success": False, "message": "Failed to connect to Dropbox"}), 500
             
+            import dropbox
             file_content = file.read()
             dbx.files_upload(file_content, dropbox_path, mode=dropbox.files.WriteMode.overwrite)
             print(f"✅ Uploaded to Dropbox: {dropbox_path}")
@@ -405,6 +516,11 @@ def get_session_messages(session_id):
             else:
                 chat_sessions[session_id]["messages"] = messages
                 chat_sessions[session_id]["email"] = email
+
+            # Restore the rolling summary so long chats stay compact after a restart
+            if session_data.get("conversation_summary"):
+                chat_sessions[session_id]["conversation_summary"] = session_data["conversation_summary"]
+                chat_sessions[session_id]["summarized_message_count"] = session_data.get("summarized_message_count", 0)
             
             return jsonify({
                 "success": True,
@@ -450,6 +566,59 @@ def get_session_logos(session_id):
     except Exception as e:
         return jsonify({"error": f"Failed to get logos: {str(e)}"}), 500
 
+def is_admin_request():
+    """Admin endpoints require ADMIN_TOKEN to be set and sent as X-Admin-Token"""
+    import hmac
+    admin_token = get_admin_token()
+    provided_token = request.headers.get("X-Admin-Token", "")
+    return bool(admin_token) and hmac.compare_digest(provided_token, admin_token)
+
+@app.route("/admin/reindex", methods=["GET", "POST"])
+def admin_reindex():
+    print(f">>> Admin reindex endpoint hit ({request.method})")
+    if not is_admin_request():
+        return jsonify({"error": "Unauthorized"}), 401
+
+    if request.method == "POST":
+        from_scratch = bool((request.get_json(silent=True) or {}).get("from_scratch"))
+        started = retrieval_service.reindex_in_background(client, from_scratch=from_scratch)
+        return jsonify({
+            "started": started,
+            "message": "Reindex started" if started else "Reindex already in progress",
+            "version": retrieval_service.version,
+            "status": retrieval_service.reindex_status
+        }), 202 if started else 409
+
+    return jsonify({
+        "version": retrieval_service.version,
+        "status": retrieval_service.reindex_status
+    })
+
+@app.route("/admin/metrics", methods=["GET"])
+def admin_metrics():
+    print(">>> Admin metrics endpoint hit")
+    if not is_admin_request():
+        return jsonify({"error": "Unauthorized"}), 401
+
+    from embeddings.query_embedding_cache import query_embedding_cache
+    from embeddings.embedding_cache import get_embedding_cache
+    from chatbot.answer_cache import answer_cache
+    from chatbot.retrieval_gate import retrieval_gate
+    from chatbot.llm_gateway import llm_gateway
+    from chatbot.response_cache import llm_response_cache
+
+    embedding_cache = get_embedding_cache()
+    return jsonify({
+        "knowledge_base_version": retrieval_service.version,
+        "query_embedding_cache": query_embedding_cache.stats() if query_embedding_cache else None,
+        "embedding_cache": embedding_cache.stats() if embedding_cache else None,
+        "answer_cache": answer_cache.stats() if answer_cache else None,
+        "llm_response_cache": llm_response_cache.stats() if llm_response_cache else None,
+        "retrieval_gate": retrieval_gate.stats(),
+        "llm_gateway": llm_gateway.stats(),
+        "usage": usage_tracker.stats() if usage_tracker else None
+    })
+
 if __name__ == "__main__":
     debug_mode = os.getenv('FLASK_DEBUG', 'false').lower() == 'true'
     app.run(host="0.0.0.0", port=5000, debug=debug_mode)
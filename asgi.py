@@ -0,0 +1,146 @@
+"""
+ASGI entry point: uvicorn asgi:app --host 0.0.0.0 --port 5000
+
+/chat and /chat/stream run on the event loop with the async OpenAI client,
+so a waiting chat holds a coroutine rather than a thread. Retrieval and the
+blocking integrations (HubSpot, Google Sheets, MongoDB) run on a bounded
+thread pool, and a turn is persisted after its response has been sent.
+Every other route is served by the Flask app in app.py, which shares the
+same in-memory sessions; run a single process, as with app.run.
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from a2wsgi import WSGIMiddleware
+from openai import AsyncOpenAI
+from starlette.applications import Starlette
+from starlette.background import BackgroundTask
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Mount, Route
+
+from app import (
+    app as flask_app, openai_key, chat_sessions, ensure_chat_session, record_assistant_reply, persist_chat_turn,
+    LLM_BUSY_MESSAGE
+)
+from chatbot.chatbot import generate_sign_nize_response_async, stream_sign_nize_response_async, QUOTE_FORM_TRIGGER
+from chatbot.llm_gateway import LLMUnavailableError
+from chatbot.streaming import QuoteTriggerFilter, format_sse
+from environment import get_asgi_config
+
+asgi_config = get_asgi_config()
+
+async_client = AsyncOpenAI(api_key=openai_key)
+blocking_executor = ThreadPoolExecutor(max_workers=asgi_config['blocking_workers'], thread_name_prefix="asgi-blocking")
+
+
+async def run_blocking(func, *args):
+    return await asyncio.get_running_loop().run_in_executor(blocking_executor, func, *args)
+
+
+async def start_chat_turn(request):
+    """Parse the /chat body, make sure the session exists and record the user message"""
+    payload = await request.json()
+    user_message = payload.get("message")
+    session_id = payload.get("session_id", "default")
+    email = payload.get("email", "")
+    print("Message received:", user_message)
+    print("Email:", email)
+
+    await run_blocking(ensure_chat_session, session_id, email)
+
+    chat_sessions[session_id]["messages"].append({
+        "role": "user",
+        "content": user_message
+    })
+    return session_id, user_message
+
+
+async def chat(request):
+    print(">>> /chat endpoint hit (async)")
+    session_id, user_message = await start_chat_turn(request)
+
+    try:
+        response = await generate_sign_nize_response_async(
+            async_client, user_message, chat_sessions[session_id], blocking_executor, session_id
+        )
+        quote_form_triggered = QUOTE_FORM_TRIGGER in response
+        if quote_form_triggered:
+            response = response.replace(QUOTE_FORM_TRIGGER, "")
+
+        record_assistant_reply(session_id, response, quote_form_triggered)
+        return JSONResponse({
+            "message": response,
+            "session_id": session_id,
+            "message_count": len(chat_sessions[session_id]["messages"]),
+            "quote_form_triggered": quote_form_triggered
+        }, background=BackgroundTask(run_blocking, persist_chat_turn, session_id, response))
+
+    except LLMUnavailableError as e:
+        print("LLM unavailable in generate_sign_nize_response_async:", str(e))
+        return JSONResponse({"message": LLM_BUSY_MESSAGE}, status_code=503)
+    except Exception as e:
+        print("Error in generate_sign_nize_response_async:", str(e))
+        return JSONResponse({"message": "Sorry, I encountered an error. Please try again."}, status_code=500)
+
+
+async def chat_stream(request):
+    """Async /chat/stream; same events as the Flask route"""
+    print(">>> /chat/stream endpoint hit (async)")
+    session_id, user_message = await start_chat_turn(request)
+
+    completed = {}
+
+    async def generate():
+        quote_filter = QuoteTriggerFilter()
+        try:
+            async for delta in stream_sign_nize_response_async(
+                async_client, user_message, chat_sessions[session_id], blocking_executor, session_id
+            ):
+                text = quote_filter.feed(delta)
+                if text:
+                    yield format_sse("token", {"text": text})
+            text = quote_filter.flush()
+            if text:
+                yield format_sse("token", {"text": text})
+        except LLMUnavailableError as e:
+            print("LLM unavailable in stream_sign_nize_response_async:", str(e))
+            yield format_sse("error", {"message": LLM_BUSY_MESSAGE})
+            return
+        except Exception as e:
+            print("Error in stream_sign_nize_response_async:", str(e))
+            yield format_sse("error", {"message": "Sorry, I encountered an error. Please try again."})
+            return
+
+        completed["response"] = quote_filter.text
+        record_assistant_reply(session_id, quote_filter.text, quote_filter.triggered)
+        yield format_sse("done", {
+            "session_id": session_id,
+            "message_count": len(chat_sessions[session_id]["messages"]),
+            "quote_form_triggered": quote_filter.triggered
+        })
+
+    async def persist_turn():
+        # Only completed answers are stored; an aborted stream leaves just the user message
+        if "response" in completed:
+            await run_blocking(persist_chat_turn, session_id, completed["response"])
+
+    return StreamingResponse(
+        generate(),
+        media_type="text/event-stream",
+        # Disable proxy buffering (nginx) so tokens are delivered as they are produced
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        background=BackgroundTask(persist_turn)
+    )
+
+
+app = Starlette(
+    routes=[
+        Route("/chat", chat, methods=["POST"]),
+        Route("/chat/stream", chat_stream, methods=["POST"]),
+        Mount("/", app=WSGIMiddleware(flask_app, workers=asgi_config['wsgi_workers']))
+    ],
+    # Same open CORS policy as CORS(app) in app.py, applied to the async routes too
+    middleware=[Middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"])]
+)
@@ -0,0 +1,60 @@
+"""Build a versioned knowledge base index artifact outside the web process.
+
+Usage:
+    python build_index.py                 # incremental build on top of the active artifact
+    python build_index.py --from-scratch  # re-embed everything
+    python build_index.py --keep 5        # keep the five newest artifacts
+
+Web workers open the artifact named in <index dir>/CURRENT read-only and
+skip ingestion entirely, so this can run once in the release pipeline.
+"""
+import argparse
+import sys
+
+from openai import OpenAI
+
+from environment import get_retrieval_config, get_openai_key
+from ingestion.index_artifacts import build_index_artifact, prune_index_artifacts, artifact_build_lock
+
+
+def main(argv=None):
+    retrieval_config = get_retrieval_config()
+
+    parser = argparse.ArgumentParser(description="Build the Signize knowledge base index artifact")
+    parser.add_argument("--data-dir", default=retrieval_config['data_dir'], help="Directory with source documents")
+    parser.add_argument("--index-dir", default=retrieval_config['index_dir'], help="Directory holding index artifacts")
+    parser.add_argument("--from-scratch", action="store_true", help="Ignore the active artifact and re-embed everything")
+    parser.add_argument("--no-activate", action="store_true", help="Build the artifact without pointing CURRENT at it")
+    parser.add_argument("--keep", type=int, default=3, help="Number of artifacts to keep (0 keeps all)")
+    args = parser.parse_args(argv)
+
+    openai_key = get_openai_key()
+    client = OpenAI(api_key=openai_key)
+
+    try:
+        # Waits for a reindex running in a web worker instead of racing it
+        with artifact_build_lock(args.index_dir):
+            version = build_index_artifact(
+                client,
+                openai_key,
+                args.data_dir,
+                args.index_dir,
+                collection_name=retrieval_config['collection_name'],
+                from_scratch=args.from_scratch,
+                activate=not args.no_activate,
+                quantization=retrieval_config['quantization'],
+                # A single-threaded CLI process can safely fork a PDF extraction pool
+                pdf_processes=True
+            )
+    except Exception as e:
+        print(f"❌ Index build failed: {e}")
+        return 1
+
+    prune_index_artifacts(args.index_dir, keep=args.keep)
+
+    print(version)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,154 @@
+import re
+import time
+import threading
+
+from environment import get_semantic_cache_config
+
+# Turns about orders, quotes or contact details depend on session state and
+# must always go to the model.
+STATEFUL_PATTERNS = [
+    re.compile(r'[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}'),  # email address
+    re.compile(r'\b\d{4,}\b'),  # order IDs, phone numbers
+    re.compile(r'\b(order|tracking|track|refund|cancel|delivery status|shipped|invoice|proposal)\b', re.IGNORECASE),
+    re.compile(r'\b(quote|mockup|mock-up|estimate|pricing|price|cost|update|modify|change my)\b', re.IGNORECASE),
+    re.compile(r'\b(bye|goodbye|thanks|thank you)\b', re.IGNORECASE),
+]
+
+# Follow-ups that only make sense with the previous turns
+CONTEXTUAL_PREFIXES = ("and ", "also ", "what about", "how about", "that ", "this ", "those ", "it ", "yes", "no ", "ok")
+
+MIN_QUESTION_WORDS = 4
+
+
+def is_cacheable_turn(user_message, session_data):
+    """
+    Decide whether a turn is a stateless informational question.
+
+    Returns (cacheable, reason). The first turns (before email collection),
+    session-specific requests and context-dependent follow-ups are excluded.
+    """
+    message = (user_message or "").strip()
+    has_email = bool(session_data.get("email") or session_data.get("customer_info", {}).get("email"))
+    if not has_email:
+        return False, "email_not_collected"
+    if len(message.split()) < MIN_QUESTION_WORDS:
+        return False, "too_short"
+    if message.lower().startswith(CONTEXTUAL_PREFIXES):
+        return False, "contextual_follow_up"
+    for pattern in STATEFUL_PATTERNS:
+        if pattern.search(message):
+            return False, "stateful"
+    return True, "informational"
+
+
+class SemanticAnswerCache:
+    """Serve stored answers to near-duplicate informational questions.
+
+    Entries hold (question embedding, retrieved chunk ids, answer). A lookup
+    hits when cosine similarity is at least `similarity_threshold` and the new
+    retrieval shares at least half of the stored chunk ids. All entries are
+    dropped when the knowledge base version changes.
+    """
+
+    def __init__(self, similarity_threshold=0.95, max_entries=500, ttl_seconds=86400):
+        self.similarity_threshold = similarity_threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.kb_version = None
+        self._entries = []
+        self._matrix = None  # normalised embeddings stacked for one matrix-vector product
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.skipped = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def _normalize(embedding):
+        import numpy as np
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _check_version(self, kb_version):
+        if kb_version != self.kb_version:
+            if self._entries:
+                print(f"♻️  Knowledge base changed ({self.kb_version} -> {kb_version}) - clearing answer cache")
+                self.invalidations += 1
+            self._entries = []
+            self._matrix = None
+            self.kb_version = kb_version
+
+    def _expire(self):
+        now = time.time()
+        live_entries = [entry for entry in self._entries if entry["expires_at"] > now]
+        if len(live_entries) != len(self._entries):
+            self._entries = live_entries
+            self._matrix = None
+
+    def lookup(self, query_embedding, chunk_ids, kb_version):
+        """Return the cached answer for a near-duplicate question, or None"""
+        import numpy as np
+
+        with self._lock:
+            self._check_version(kb_version)
+            self._expire()
+            if not self._entries:
+                self.misses += 1
+                return None
+
+            if self._matrix is None:
+                self._matrix = np.vstack([entry["embedding"] for entry in self._entries])
+            similarities = self._matrix @ self._normalize(query_embedding)
+            best = int(np.argmax(similarities))
+            entry = self._entries[best]
+
+            shared_chunks = len(set(chunk_ids) & set(entry["chunk_ids"]))
+            if similarities[best] >= self.similarity_threshold and shared_chunks * 2 >= len(entry["chunk_ids"]):
+                self.hits += 1
+                print(f"⚡ Semantic answer cache hit (similarity {similarities[best]:.3f}): {entry['question'][:60]}")
+                return entry["answer"]
+
+            self.misses += 1
+            return None
+
+    def store(self, question, query_embedding, chunk_ids, answer, kb_version):
+        with self._lock:
+            self._check_version(kb_version)
+            self._entries.append({
+                "question": question,
+                "embedding": self._normalize(query_embedding),
+                "chunk_ids": list(chunk_ids),
+                "answer": answer,
+                "expires_at": time.time() + self.ttl_seconds
+            })
+            if len(self._entries) > self.max_entries:
+                self._entries = self._entries[-self.max_entries:]
+            self._matrix = None
+
+    def record_skip(self):
+        with self._lock:
+            self.skipped += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "kb_version": self.kb_version,
+                "similarity_threshold": self.similarity_threshold,
+                "hits": self.hits,
+                "misses": self.misses,
+                "skipped_turns": self.skipped,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "invalidations": self.invalidations
+            }
+
+
+_config = get_semantic_cache_config()
+
+# Create global instance (None unless SEMANTIC_CACHE_ENABLED=true)
+answer_cache = (
+    SemanticAnswerCache(_config['similarity_threshold'], _config['max_entries'], _config['ttl_seconds'])
+    if _config['enabled'] else None
+)
@@ -1,13 +1,25 @@
+import asyncio
+import time
 from mongodb_operations import mongodb_manager
 from datetime import datetime
-from prompt.prompt import SIGN_NIZE_SYSTEM_PROMPT
-from documents_processing_responses.query_and_response import query_documents
-from chromadb_setup import initialize_chromadb
+from prompt.prompt_assembler import assemble_conversation, build_prompt_messages, prompt_section_tokens
+from retrieval.retrieval_service import retrieval_service
+from chatbot.answer_cache import answer_cache, is_cacheable_turn
+from chatbot.retrieval_gate import retrieval_gate
+from chatbot.llm_gateway import llm_gateway
+from chatbot.usage_tracking import usage_tracker, build_turn_record
+from chatbot.response_cache import llm_response_cache
 from environment import load_environment
 
 # Load environment variables
 openai_key = load_environment()
 
+CHAT_MODEL = "gpt-4o-mini"
+CHAT_MAX_TOKENS = 1500
+# Sampling parameters of every chat call; part of the response cache key
+CHAT_COMPLETION_PARAMS = {"max_tokens": CHAT_MAX_TOKENS, "temperature": 0.0}
+QUOTE_FORM_TRIGGER = "[QUOTE_FORM_TRIGGER]"
+
 def build_conversation_text(messages: list, session_id: str = None) -> str:
     import re
 
@@ -92,40 +104,66 @@ def build_conversation_text(messages: list, session_id: str = None) -> str:
 
     return "\n".join(lines)
 
-# Initialize RAG system
-print("🚀 Initializing RAG system...")
-try:
-    chroma_collection = initialize_chromadb(openai_key)
-    print("✅ ChromaDB collection initialized")
-except Exception as e:
-    print(f"⚠️  Failed to initialize ChromaDB: {e}")
-    chroma_collection = None
+def prepare_sign_nize_turn(user_message, session_data):
+    """
+    Do everything before the model call: retrieval, the answer cache lookup
+    and prompt assembly.
 
-def generate_sign_nize_response(client, user_message, session_data):
-    """Generate response using the Sign-nize customer support system prompt with context awareness and RAG"""
+    Returns {"cached_answer", "messages", "cache_entry", "started", "timings",
+    "details"}; when cached_answer is set no model call is needed.
+    cache_entry is passed back to store_sign_nize_answer once the answer is
+    known, and the rest to record_sign_nize_usage.
+    """
 
+    started = time.perf_counter()
     current_date = datetime.now().strftime('%B %d, %Y')
-    system_prompt = SIGN_NIZE_SYSTEM_PROMPT.replace('{{date}}', current_date)
 
-    knowledge_context = ""
-    if chroma_collection:
+    knowledge_chunks = []
+    search_results = None
+    needs_retrieval, _ = retrieval_gate.should_retrieve(user_message)
+    if needs_retrieval:
         try:
             print("🔍 Querying knowledge base for relevant information...")
-            relevant_chunks = query_documents(chroma_collection, [user_message], n_results=3)
+            # Upper bound: the relevance threshold and token budget usually select fewer
+            search_results = retrieval_service.search(user_message, n_results=3)
+            relevant_chunks = search_results["documents"]
             if relevant_chunks and relevant_chunks[0]:
-                knowledge_context = "\n\nKNOWLEDGE BASE CONTEXT:\n" + "\n\n".join(relevant_chunks)
+                knowledge_chunks = relevant_chunks
                 print(f"✅ Found {len(relevant_chunks)} relevant knowledge chunks")
             else:
                 print("ℹ️  No relevant knowledge base information found")
         except Exception as e:
             print(f"⚠️  Error querying knowledge base: {e}")
 
-    conversation_context = ""
-    if session_data["messages"]:
-        conversation_context = "\n\nFULL CONVERSATION HISTORY:\n"
-        for msg in session_data["messages"]:
-            role = "User" if msg["role"] == "user" else "Assistant"
-            conversation_context += f"{role}: {msg['content']}\n"
+    timings = {"retrieval": time.perf_counter() - started}
+    if search_results:
+        timings.update({f"retrieval.{stage}": seconds for stage, seconds in search_results["timings"].items()})
+    details = {
+        "retrieval_mode": search_results["mode"] if search_results else None,
+        "context_chunks": len(knowledge_chunks)
+    }
+
+    # Semantic answer cache (opt-in): near-duplicate informational questions
+    # are answered from cache when they retrieve the same knowledge chunks
+    cache_entry = None
+    if answer_cache and search_results and search_results["query_embedding"] is not None:
+        cacheable_turn, reason = is_cacheable_turn(user_message, session_data)
+        if cacheable_turn:
+            cached_answer = answer_cache.lookup(
+                search_results["query_embedding"], search_results["ids"], retrieval_service.version
+            )
+            if cached_answer:
+                return {"cached_answer": cached_answer, "messages": None, "cache_entry": None,
+                        "started": started, "timings": timings, "details": details}
+            cache_entry = {
+                "question": user_message,
+                "query_embedding": search_results["query_embedding"],
+                "chunk_ids": search_results["ids"],
+                "kb_version": retrieval_service.version
+            }
+        else:
+            answer_cache.record_skip()
+            print(f"ℹ️  Answer cache skipped: {reason}")
 
     email_already_collected = False
     email_value = None
@@ -150,65 +188,202 @@ def generate_sign_nize_response(client, user_message, session_data):
                     session_data["email"] = email_value
                     break
 
-    email_context = ""
     if email_value:
-        email_context = f"""
-CURRENT SESSION EMAIL: {email_value}
-- This email has already been collected and verified
-- Do NOT ask for email again in this session
-- Use this email for all quote requests and order tracking
-- If customer says "bye" and then starts talking again, they still have the same email
-"""
         print(f"📧 Email context injected: {email_value}")
     else:
-        email_context = """
-CURRENT SESSION EMAIL: NOT COLLECTED
-- This is a new conversation or email not yet provided
-- Follow the email collection process for first message
-"""
         print("📧 Email context: NOT COLLECTED")
 
     print(f"🔍 Email already collected: {email_already_collected}")
     print(f"📧 Email value: {email_value}")
 
-    context_instructions = f"""
-
-CONTEXT INSTRUCTIONS:
-1. CAREFULLY READ the full conversation history above.
-2. If this is the customer's FIRST message in the conversation, ALWAYS ask for email first.
-3. If email is already collected, NEVER ask for it again - this is a CRITICAL rule.
-4. After email collection, ask "How can I help you with your sign needs today?"
-5. Handle order issues by collecting Order ID and phone number, then tell customer representative will contact them.
-6. For general sign questions after order issues, provide helpful information without asking "How can I help you" again.
-7. CRITICAL: Trigger quote form with [QUOTE_FORM_TRIGGER] when customer says ANYTHING about wanting mockup, quote, pricing, or estimate - this is a TOP PRIORITY.
-8. CRITICAL: Even if customer says "Hi" again after email collection, do NOT ask for email - just say "Hello! How can I help you with your sign needs today?"
-9. CRITICAL: When customer wants to update/modify their quote, ALWAYS trigger the form with [QUOTE_FORM_TRIGGER].
-10. CRITICAL: For irrelevant questions (weather, politics, etc.), redirect to signage topics professionally.
-11. CRITICAL: For goodbye messages, give warm Signize farewell.
-12. CRITICAL: Questions about signs, materials, installation, pricing, etc. are ALWAYS relevant - answer them helpfully.
-13. CRITICAL: When customers ask about specific sign types (2D, 3D, metal, acrylic, etc.), provide detailed information about those types - NEVER give generic greetings.
-14. CRITICAL: Use the knowledge base to provide comprehensive answers about sign types, materials, and applications.
-15. CRITICAL: The email {email_value if email_value else 'has not been collected yet'} - use this information to determine if email collection is needed.
-16. CRITICAL: Email persists throughout the session - if customer says "bye" and then talks again, they still have the same email.
-17. CRITICAL: Only ask for email if this is a completely new session or if email was never collected.
-"""
-
-    full_prompt = system_prompt + email_context + context_instructions + knowledge_context + conversation_context + f"\n\nCurrent User Message: {user_message}"
-
-    response = client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=[
-            {
-                "role": "system",
-                "content": full_prompt,
-            },
-            {
-                "role": "user",
-                "content": user_message,
-            },
-        ],
-        max_tokens=1500,
-        temperature=0.0
+    # Rolling summary plus recent history within a token budget; key facts
+    # are kept even when the turns that mentioned them are trimmed
+    assembly_started = time.perf_counter()
+    conversation = assemble_conversation(session_data, user_message)
+    prompt_messages = build_prompt_messages(conversation, user_message, knowledge_chunks, current_date)
+    timings["prompt_assembly"] = time.perf_counter() - assembly_started
+    details["history_messages_omitted"] = conversation["omitted"]
+    return {"cached_answer": None, "messages": prompt_messages, "cache_entry": cache_entry,
+            "started": started, "timings": timings, "details": details}
+
+def store_sign_nize_answer(cache_entry, answer):
+    """Add a freshly generated answer to the semantic answer cache"""
+    if cache_entry and answer and QUOTE_FORM_TRIGGER not in answer:
+        answer_cache.store(
+            cache_entry["question"], cache_entry["query_embedding"], cache_entry["chunk_ids"], answer,
+            cache_entry["kb_version"]
+        )
+
+def lookup_cached_completion(turn):
+    """Answer stored for this exact prompt (model, parameters, messages), if any"""
+    if not llm_response_cache:
+        return None
+    answer = llm_response_cache.get(CHAT_MODEL, CHAT_COMPLETION_PARAMS, turn["messages"])
+    if answer is not None:
+        print("⚡ Exact prompt match - answered from LLM response cache")
+    return answer
+
+def store_completion(turn, answer, finish_reason):
+    """Cache a completed answer; truncated or filtered answers are not reused"""
+    if llm_response_cache and answer and finish_reason == "stop":
+        llm_response_cache.put(CHAT_MODEL, CHAT_COMPLETION_PARAMS, turn["messages"], answer)
+
+def record_sign_nize_usage(turn, session_id, usage=None, **details):
+    """Record tokens, cost and per-stage durations of a finished turn (usage is the API's usage object)"""
+    if not usage_tracker:
+        return
+    timings = dict(turn["timings"], total=time.perf_counter() - turn["started"])
+    usage_tracker.record_turn(session_id or "default", build_turn_record(
+        CHAT_MODEL, timings, usage,
+        prompt_section_tokens(turn["messages"]) if turn["messages"] else None,
+        answer_cache_hit=bool(turn["cached_answer"]),
+        **turn["details"], **details
+    ))
+
+def generate_sign_nize_response(client, user_message, session_data, session_id=None):
+    """Generate response using the Sign-nize customer support system prompt with context awareness and RAG"""
+    turn = prepare_sign_nize_turn(user_message, session_data)
+    if turn["cached_answer"]:
+        record_sign_nize_usage(turn, session_id)
+        return turn["cached_answer"]
+
+    cached_completion = lookup_cached_completion(turn)
+    if cached_completion is not None:
+        record_sign_nize_usage(turn, session_id, llm_cache_hit=True)
+        return cached_completion
+
+    generation_started = time.perf_counter()
+    response = llm_gateway.create_chat_completion(
+        client, session_id,
+        model=CHAT_MODEL,
+        messages=turn["messages"],
+        **CHAT_COMPLETION_PARAMS
     )
-
-    return response.choices[0].message.content
+    turn["timings"]["generation"] = time.perf_counter() - generation_started
+
+    answer = response.choices[0].message.content
+    store_sign_nize_answer(turn["cache_entry"], answer)
+    store_completion(turn, answer, response.choices[0].finish_reason)
+    record_sign_nize_usage(turn, session_id, response.usage)
+    return answer
+
+def stream_sign_nize_response(client, user_message, session_data, session_id=None):
+    """Same as generate_sign_nize_response, but yields the answer as text deltas as the model produces them"""
+    turn = prepare_sign_nize_turn(user_message, session_data)
+    if turn["cached_answer"]:
+        record_sign_nize_usage(turn, session_id, streamed=True)
+        yield turn["cached_answer"]
+        return
+
+    cached_completion = lookup_cached_completion(turn)
+    if cached_completion is not None:
+        record_sign_nize_usage(turn, session_id, llm_cache_hit=True, streamed=True)
+        yield cached_completion
+        return
+
+    generation_started = time.perf_counter()
+    parts = []
+    usage = None
+    finish_reason = None
+    for chunk in llm_gateway.stream_chat_completion(
+        client, session_id,
+        model=CHAT_MODEL,
+        messages=turn["messages"],
+        **CHAT_COMPLETION_PARAMS,
+        # The last chunk then carries the token usage (with no choices)
+        stream_options={"include_usage": True}
+    ):
+        if chunk.usage:
+            usage = chunk.usage
+        if not chunk.choices:
+            continue
+        finish_reason = chunk.choices[0].finish_reason or finish_reason
+        delta = chunk.choices[0].delta.content
+        if delta:
+            if not parts:
+                turn["timings"]["first_token"] = time.perf_counter() - generation_started
+            parts.append(delta)
+            yield delta
+    turn["timings"]["generation"] = time.perf_counter() - generation_started
+
+    answer = "".join(parts)
+    store_sign_nize_answer(turn["cache_entry"], answer)
+    store_completion(turn, answer, finish_reason)
+    record_sign_nize_usage(turn, session_id, usage, streamed=True)
+
+async def generate_sign_nize_response_async(async_client, user_message, session_data, executor=None, session_id=None):
+    """
+    Async generate_sign_nize_response for the ASGI app (AsyncOpenAI client).
+
+    Retrieval and prompt assembly are blocking, so they run on executor (the
+    loop's default pool when None); the model call is awaited on the loop.
+    """
+    loop = asyncio.get_running_loop()
+    turn = await loop.run_in_executor(executor, prepare_sign_nize_turn, user_message, session_data)
+    if turn["cached_answer"]:
+        record_sign_nize_usage(turn, session_id)
+        return turn["cached_answer"]
+
+    cached_completion = lookup_cached_completion(turn)
+    if cached_completion is not None:
+        record_sign_nize_usage(turn, session_id, llm_cache_hit=True)
+        return cached_completion
+
+    generation_started = time.perf_counter()
+    response = await llm_gateway.create_chat_completion_async(
+        async_client, session_id,
+        model=CHAT_MODEL,
+        messages=turn["messages"],
+        **CHAT_COMPLETION_PARAMS
+    )
+    turn["timings"]["generation"] = time.perf_counter() - generation_started
+
+    answer = response.choices[0].message.content
+    store_sign_nize_answer(turn["cache_entry"], answer)
+    store_completion(turn, answer, response.choices[0].finish_reason)
+    record_sign_nize_usage(turn, session_id, response.usage)
+    return answer
+
+async def stream_sign_nize_response_async(async_client, user_message, session_data, executor=None, session_id=None):
+    """Async stream_sign_nize_response: yields text deltas from an AsyncOpenAI stream"""
+    loop = asyncio.get_running_loop()
+    turn = await loop.run_in_executor(executor, prepare_sign_nize_turn, user_message, session_data)
+    if turn["cached_answer"]:
+        record_sign_nize_usage(turn, session_id, streamed=True)
+        yield turn["cached_answer"]
+        return
+
+    cached_completion = lookup_cached_completion(turn)
+    if cached_completion is not None:
+        record_sign_nize_usage(turn, session_id, llm_cache_hit=True, streamed=True)
+        yield cached_completion
+        return
+
+    generation_started = time.perf_counter()
+    parts = []
+    usage = None
+    finish_reason = None
+    async for chunk in llm_gateway.stream_chat_completion_async(
+        async_client, session_id,
+        model=CHAT_MODEL,
+        messages=turn["messages"],
+        **CHAT_COMPLETION_PARAMS,
+        stream_options={"include_usage": True}
+    ):
+        if chunk.usage:
+            usage = chunk.usage
+        if not chunk.choices:
+            continue
+        finish_reason = chunk.choices[0].finish_reason or finish_reason
+        delta = chunk.choices[0].delta.content
+        if delta:
+            if not parts:
+                turn["timings"]["first_token"] = time.perf_counter() - generation_started
+            parts.append(delta)
+            yield delta
+    turn["timings"]["generation"] = time.perf_counter() - generation_started
+
+    answer = "".join(parts)
+    store_sign_nize_answer(turn["cache_entry"], answer)
+    store_completion(turn, answer, finish_reason)
+    record_sign_nize_usage(turn, session_id, usage, streamed=True)
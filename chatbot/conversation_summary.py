@@ -0,0 +1,114 @@
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from environment import get_summary_config
+from mongodb_operations import mongodb_manager
+from prompt.prompt_assembler import count_message_tokens
+from chatbot.llm_gateway import llm_gateway
+from chatbot.usage_tracking import usage_tracker, build_turn_record
+
+SUMMARY_INSTRUCTIONS = """You maintain a running summary of a Signize customer support chat.
+Update the existing summary with the new messages. Keep it under 150 words and write plain sentences.
+Preserve: the customer's sign needs (type, size, materials, illumination, placement, location, budget, deadline),
+questions already answered, decisions made, open requests, and any email, order ID or phone number given.
+Drop greetings and small talk. Return only the updated summary."""
+
+
+class ConversationSummarizer:
+    """Fold older turns of long chats into a rolling summary stored on the session.
+
+    After a turn, messages that have aged out of the newest keep_recent_messages
+    are summarized once trigger_messages of them (or trigger_tokens worth)
+    have built up. The summary is extended incrementally (previous summary +
+    new messages) on a background thread, so the reply is never delayed, and
+    persisted with mongodb_manager so it survives restarts. Summary calls go
+    through llm_gateway like chat turns and are recorded as usage of kind
+    "summary".
+    """
+
+    def __init__(self, trigger_messages=10, trigger_tokens=1200, keep_recent_messages=6, model="gpt-4o-mini",
+                 max_workers=2):
+        self.trigger_messages = trigger_messages
+        self.trigger_tokens = trigger_tokens
+        self.keep_recent_messages = keep_recent_messages
+        self.model = model
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="conversation-summary")
+        self._in_flight = set()
+        self._lock = threading.Lock()
+
+    def _pending_range(self, session_data):
+        messages = session_data.get("messages", [])
+        start = min(session_data.get("summarized_message_count", 0), len(messages))
+        end = max(start, len(messages) - self.keep_recent_messages)
+        return start, end
+
+    def should_summarize(self, session_data):
+        start, end = self._pending_range(session_data)
+        pending = session_data.get("messages", [])[start:end]
+        if not pending:
+            return False
+        return (len(pending) >= self.trigger_messages
+                or sum(count_message_tokens(message) for message in pending) >= self.trigger_tokens)
+
+    def maybe_schedule(self, client, session_id, session_data):
+        """Start a background summary update when the threshold is reached; returns True if started"""
+        if not self.should_summarize(session_data):
+            return False
+        with self._lock:
+            if session_id in self._in_flight:
+                return False
+            self._in_flight.add(session_id)
+        self._executor.submit(self._run, client, session_id, session_data)
+        return True
+
+    def _run(self, client, session_id, session_data):
+        try:
+            start, end = self._pending_range(session_data)
+            messages = session_data.get("messages", [])[start:end]
+            if not messages:
+                return
+            summary = self.summarize(client, session_data.get("conversation_summary"), messages, session_id)
+            # Summary before count: a concurrent prompt may repeat a few messages, but never lose any
+            session_data["conversation_summary"] = summary
+            session_data["summarized_message_count"] = end
+            print(f"📝 Conversation summary updated for session {session_id}: {end} message(s) summarized")
+            mongodb_manager.update_conversation_summary(session_id, summary, end)
+            if usage_tracker:
+                usage_tracker.flush_session(session_id)
+        except Exception as e:
+            print(f"⚠️  Failed to update conversation summary for session {session_id}: {e}")
+        finally:
+            with self._lock:
+                self._in_flight.discard(session_id)
+
+    def summarize(self, client, previous_summary, messages, session_id=None):
+        transcript = "\n".join(
+            f"{'User' if message['role'] == 'user' else 'Assistant'}: {message['content']}" for message in messages
+        )
+        started = time.perf_counter()
+        response = llm_gateway.create_chat_completion(
+            client, session_id,
+            model=self.model,
+            messages=[
+                {"role": "system", "content": SUMMARY_INSTRUCTIONS},
+                {"role": "user", "content": f"EXISTING SUMMARY:\n{previous_summary or '(none)'}\n\nNEW MESSAGES:\n{transcript}"}
+            ],
+            max_tokens=400,
+            temperature=0.0
+        )
+        if usage_tracker:
+            usage_tracker.record_turn(session_id or "default", build_turn_record(
+                self.model, {"summary": time.perf_counter() - started}, response.usage, kind="summary"
+            ))
+        return response.choices[0].message.content.strip()
+
+
+_config = get_summary_config()
+
+# Create global instance (None when SUMMARY_ENABLED=false)
+conversation_summarizer = (
+    ConversationSummarizer(
+        _config['trigger_messages'], _config['trigger_tokens'], _config['keep_recent_messages'], _config['model']
+    ) if _config['enabled'] else None
+)
@@ -0,0 +1,269 @@
+import asyncio
+import random
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager, contextmanager
+from email.utils import parsedate_to_datetime
+
+from openai import APIConnectionError, APIStatusError
+
+from environment import get_llm_gateway_config
+
+# Status codes worth retrying: timeouts, lock conflicts, rate limits and server errors
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+
+
+class LLMUnavailableError(Exception):
+    """The model could not be reached after all retries (rate limited, timing out or down)"""
+
+
+def retry_after_seconds(error):
+    """Read the wait the API asked for from retry-after-ms / retry-after, if any"""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000.0
+        retry_after = headers.get("retry-after")
+        if not retry_after:
+            return None
+        try:
+            return float(retry_after)
+        except ValueError:
+            return max(0.0, parsedate_to_datetime(retry_after).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def is_retryable(error):
+    if isinstance(error, APIConnectionError):  # includes APITimeoutError
+        return True
+    return isinstance(error, APIStatusError) and error.status_code in RETRYABLE_STATUS_CODES
+
+
+class LLMGateway:
+    """Admission control for chat completion calls shared by every request.
+
+    At most max_concurrency calls run at once. Callers beyond that wait in a
+    per-session queue and free slots are handed out round-robin across
+    sessions, so one busy session cannot starve the others. Threads (Flask)
+    and coroutines (asgi.py) share the same slots. Rate limits, timeouts and
+    5xx errors are retried with exponential backoff and full jitter; a
+    Retry-After from the API pauses all new calls until it has passed.
+    """
+
+    def __init__(self, max_concurrency=8, max_retries=4, base_delay=0.5, max_delay=20.0):
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._lock = threading.Lock()
+        self._active = 0
+        self._queues = OrderedDict()  # session_id -> deque of waiters, in round-robin order
+        self._paused_until = 0.0
+        self.calls = 0
+        self.queued = 0
+        self.retries = 0
+        self.rate_limited = 0
+        self.failures = 0
+        self.max_queue_depth = 0
+        self._total_wait = 0.0
+
+    # Admission
+
+    def _queue_depth(self):
+        return sum(len(waiters) for waiters in self._queues.values())
+
+    def _admit_or_enqueue(self, session_id, waiter):
+        """Take a free slot (returns True) or join the session's queue; call with the lock held"""
+        self.calls += 1
+        if self._active < self.max_concurrency and not self._queues:
+            self._active += 1
+            return True
+        self._queues.setdefault(session_id, deque()).append(waiter)
+        self.queued += 1
+        self.max_queue_depth = max(self.max_queue_depth, self._queue_depth())
+        return False
+
+    def _release(self):
+        """Hand the slot to the next session in round-robin order, or free it"""
+        with self._lock:
+            if not self._queues:
+                self._active -= 1
+                return
+            session_id, waiters = next(iter(self._queues.items()))
+            waiter = waiters.popleft()
+            if waiters:
+                self._queues.move_to_end(session_id)
+            else:
+                del self._queues[session_id]
+        self._wake(waiter)
+
+    @staticmethod
+    def _wake(waiter):
+        if isinstance(waiter, threading.Event):
+            waiter.set()
+        else:
+            loop, future = waiter
+            loop.call_soon_threadsafe(lambda: future.done() or future.set_result(None))
+
+    def _remove_waiter(self, session_id, waiter):
+        with self._lock:
+            waiters = self._queues.get(session_id)
+            if not waiters or waiter not in waiters:
+                return False
+            waiters.remove(waiter)
+            if not waiters:
+                del self._queues[session_id]
+            return True
+
+    def _record_wait(self, started):
+        with self._lock:
+            self._total_wait += time.monotonic() - started
+
+    @contextmanager
+    def slot(self, session_id):
+        """Hold one concurrency slot (blocking the thread while queued)"""
+        started = time.monotonic()
+        event = threading.Event()
+        with self._lock:
+            admitted = self._admit_or_enqueue(session_id, event)
+        if not admitted:
+            event.wait()
+        self._record_wait(started)
+        try:
+            yield
+        finally:
+            self._release()
+
+    @asynccontextmanager
+    async def slot_async(self, session_id):
+        """Hold one concurrency slot (awaiting, not blocking, while queued)"""
+        started = time.monotonic()
+        loop = asyncio.get_running_loop()
+        waiter = (loop, loop.create_future())
+        with self._lock:
+            admitted = self._admit_or_enqueue(session_id, waiter)
+        if not admitted:
+            try:
+                await waiter[1]
+            except asyncio.CancelledError:
+                # Client went away: leave the queue, or pass on a slot handed over meanwhile
+                if not self._remove_waiter(session_id, waiter):
+                    self._release()
+                raise
+        self._record_wait(started)
+        try:
+            yield
+        finally:
+            self._release()
+
+    # Retries
+
+    def _backoff_delay(self, attempt, error):
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+        retry_after = retry_after_seconds(error)
+        if retry_after is not None:
+            # Honour the server's wait; the jitter keeps waiting callers from retrying in lockstep
+            delay = min(self.max_delay, retry_after) + random.uniform(0, self.base_delay)
+            self._paused_until = max(self._paused_until, time.monotonic() + delay)
+        return delay
+
+    def _on_error(self, attempt, error):
+        """Return the delay before the next attempt, or raise when the error is final"""
+        if getattr(error, "status_code", None) == 429:
+            self.rate_limited += 1
+        if not is_retryable(error):
+            raise error
+        if attempt >= self.max_retries:
+            self.failures += 1
+            raise LLMUnavailableError(f"LLM call failed after {attempt + 1} attempt(s): {error}") from error
+        self.retries += 1
+        delay = self._backoff_delay(attempt, error)
+        print(f"⏳ LLM call failed ({type(error).__name__}), retry {attempt + 1}/{self.max_retries} in {delay:.1f}s")
+        return delay
+
+    def call(self, func):
+        """Run func() with retries; call inside slot()"""
+        for attempt in range(self.max_retries + 1):
+            time.sleep(max(0.0, self._paused_until - time.monotonic()))
+            try:
+                return func()
+            except Exception as e:
+                delay = self._on_error(attempt, e)
+            time.sleep(delay)
+
+    async def call_async(self, func):
+        """Await func() with retries; call inside slot_async()"""
+        for attempt in range(self.max_retries + 1):
+            await asyncio.sleep(max(0.0, self._paused_until - time.monotonic()))
+            try:
+                return await func()
+            except Exception as e:
+                delay = self._on_error(attempt, e)
+            await asyncio.sleep(delay)
+
+    @staticmethod
+    def _create(client, params):
+        # The gateway does the retrying; the client's own retries would hold the slot longer
+        return client.with_options(max_retries=0).chat.completions.create(**params)
+
+    def create_chat_completion(self, client, session_id, **params):
+        with self.slot(session_id):
+            return self.call(lambda: self._create(client, params))
+
+    async def create_chat_completion_async(self, async_client, session_id, **params):
+        async with self.slot_async(session_id):
+            return await self.call_async(lambda: self._create(async_client, params))
+
+    def stream_chat_completion(self, client, session_id, **params):
+        """Yield chunks of a streamed completion; the slot is held until the stream ends or is closed"""
+        with self.slot(session_id):
+            stream = self.call(lambda: self._create(client, dict(params, stream=True)))
+            try:
+                yield from stream
+            finally:
+                # Stop generation if the client went away mid-stream
+                close = getattr(stream, "close", None)
+                if close:
+                    close()
+
+    async def stream_chat_completion_async(self, async_client, session_id, **params):
+        async with self.slot_async(session_id):
+            stream = await self.call_async(lambda: self._create(async_client, dict(params, stream=True)))
+            try:
+                async for chunk in stream:
+                    yield chunk
+            finally:
+                close = getattr(stream, "close", None)
+                if close:
+                    await close()
+
+    def stats(self):
+        with self._lock:
+            admitted = self.calls - self._queue_depth()
+            return {
+                "max_concurrency": self.max_concurrency,
+                "active": self._active,
+                "queue_depth": self._queue_depth(),
+                "queued_sessions": len(self._queues),
+                "max_queue_depth": self.max_queue_depth,
+                "calls": self.calls,
+                "queued_calls": self.queued,
+                "avg_queue_wait_ms": round(self._total_wait / admitted * 1000, 1) if admitted else 0.0,
+                "retries": self.retries,
+                "rate_limited": self.rate_limited,
+                "failures": self.failures,
+                "paused_for_s": round(max(0.0, self._paused_until - time.monotonic()), 1)
+            }
+
+
+_config = get_llm_gateway_config()
+
+# Create global instance
+llm_gateway = LLMGateway(
+    _config['max_concurrency'], _config['max_retries'], _config['backoff_base'], _config['backoff_max']
+)
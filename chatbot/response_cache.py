@@ -0,0 +1,160 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+
+from environment import get_llm_response_cache_config
+
+
+def make_response_key(model, params, messages):
+    """SHA-256 of the canonical JSON of the full request, so any change to the prompt is a new key"""
+    payload = json.dumps(
+        {"model": model, "params": params, "messages": messages},
+        sort_keys=True, ensure_ascii=False, separators=(",", ":")
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LLMResponseCache:
+    """Exact-match cache of chat completion answers.
+
+    The model runs at temperature 0, so an identical fully assembled request
+    (model, parameters, message list) gets the stored answer instead of a new
+    call; this covers first-turn greetings and other boilerplate turns. A
+    bounded in-memory LRU sits in front of an optional SQLite tier that
+    survives restarts. Only request hashes and answers are stored. With
+    bypass set, lookups always miss but fresh answers are still stored.
+    """
+
+    def __init__(self, max_entries=1000, ttl_seconds=86400, persistent_path=None, max_persistent_entries=50000,
+                 bypass=False):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.max_persistent_entries = max_persistent_entries
+        self.bypass = bypass
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.persistent_hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        self.stores = 0
+
+        self._conn = None
+        if persistent_path:
+            os.makedirs(os.path.dirname(persistent_path) or ".", exist_ok=True)
+            self._conn = sqlite3.connect(persistent_path, check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, answer TEXT NOT NULL, created_at REAL NOT NULL, last_access REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access)")
+
+    def get(self, model, params, messages):
+        if self.bypass:
+            with self._lock:
+                self.bypassed += 1
+            return None
+
+        key = make_response_key(model, params, messages)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                created_at, answer = entry
+                if now - created_at < self.ttl_seconds:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return answer
+                del self._entries[key]
+
+            if self._conn is not None:
+                row = self._conn.execute(
+                    "SELECT answer, created_at FROM responses WHERE key = ? AND created_at > ?",
+                    (key, now - self.ttl_seconds)
+                ).fetchone()
+                if row:
+                    self._conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+                    self._remember(key, row[1], row[0])
+                    self.hits += 1
+                    self.persistent_hits += 1
+                    return row[0]
+
+            self.misses += 1
+            return None
+
+    def put(self, model, params, messages, answer):
+        key = make_response_key(model, params, messages)
+        now = time.time()
+        with self._lock:
+            self._remember(key, now, answer)
+            self.stores += 1
+            if self._conn is not None:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO responses (key, answer, created_at, last_access) VALUES (?, ?, ?, ?)",
+                    (key, answer, now, now)
+                )
+                self._evict_persistent_if_needed(now)
+
+    def _remember(self, key, created_at, answer):
+        self._entries[key] = (created_at, answer)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _evict_persistent_if_needed(self, now):
+        self._conn.execute("DELETE FROM responses WHERE created_at <= ?", (now - self.ttl_seconds,))
+        count = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        if count <= self.max_persistent_entries:
+            return
+        evict_count = count - int(self.max_persistent_entries * 0.9)
+        self._conn.execute(
+            "DELETE FROM responses WHERE key IN "
+            "(SELECT key FROM responses ORDER BY last_access ASC LIMIT ?)",
+            (evict_count,)
+        )
+        print(f"🧹 Evicted {evict_count} response(s) from the LLM response cache")
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            persistent_entries = (
+                self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0] if self._conn is not None else None
+            )
+            return {
+                "bypass": self.bypass,
+                "entries": len(self._entries),
+                "persistent_entries": persistent_entries,
+                "hits": self.hits,
+                "persistent_hits": self.persistent_hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "bypassed": self.bypassed,
+                "stores": self.stores
+            }
+
+
+def _create_llm_response_cache():
+    config = get_llm_response_cache_config()
+    if not config['enabled']:
+        return None
+    if config['persist']:
+        try:
+            cache = LLMResponseCache(
+                config['max_entries'], config['ttl_seconds'], config['path'], config['max_persistent_entries'],
+                config['bypass']
+            )
+            print(f"✅ LLM response cache persisted at {config['path']}")
+            return cache
+        except Exception as e:
+            print(f"⚠️  Persistent LLM response cache unavailable, using memory only: {e}")
+    return LLMResponseCache(config['max_entries'], config['ttl_seconds'], bypass=config['bypass'])
+
+
+# Create global instance (None when LLM_RESPONSE_CACHE_ENABLED=false)
+llm_response_cache = _create_llm_response_cache()
@@ -0,0 +1,128 @@
+import re
+import threading
+import importlib
+from collections import Counter, deque
+from datetime import datetime
+
+from environment import get_retrieval_gate_config
+
+EMAIL_PATTERN = re.compile(r'[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}')
+
+# Whole-message patterns for turns the knowledge base cannot help with
+SKIP_RULES = [
+    ("greeting", re.compile(
+        r'^(hi+|hello+|hey+|hiya|yo|howdy|greetings|good (morning|afternoon|evening|day))( there| team| sign-?nize)?[\s!.,]*$',
+        re.IGNORECASE)),
+    ("farewell", re.compile(
+        r'^(bye+|goodbye|good bye|see you|see ya|cya|take care|have a (good|great|nice) (day|one))[\s!.,]*$',
+        re.IGNORECASE)),
+    ("thanks", re.compile(
+        r'^((ok(ay)?|great|perfect|awesome|cool|got it)[\s,!.]*)?(thanks|thank you|thx|ty|much appreciated)( (so|very) much)?[\s!.,]*$',
+        re.IGNORECASE)),
+    ("acknowledgement", re.compile(
+        r'^(ok(ay)?|k|sure|yes|yeah|yep|no|nope|great|perfect|awesome|cool|got it|sounds good|alright|done)[\s!.,]*$',
+        re.IGNORECASE)),
+    ("email_only", re.compile(r'^\s*(my email is\s*)?' + EMAIL_PATTERN.pattern + r'[\s.]*$', re.IGNORECASE)),
+    ("order_id_only", re.compile(r'^\s*(order\s*(id|number|no\.?)?\s*[:#]?\s*)?#?\d{4,}[\s.]*$', re.IGNORECASE)),
+    ("phone_only", re.compile(r'^\s*\+?[\d\s().-]{7,}$')),
+]
+
+RECENT_DECISIONS = 50
+
+
+def _redact(text):
+    """Mask emails and long numbers before a message is kept for /admin/metrics"""
+    return re.sub(r'\d{4,}', '<number>', EMAIL_PATTERN.sub('<email>', text))
+
+
+class RetrievalGate:
+    """Local per-turn decision on whether the knowledge base lookup is needed.
+
+    Whole-message rules catch greetings, farewells, thanks, acknowledgements
+    and bare emails, order IDs or phone numbers. Anything else retrieves,
+    unless an optional classifier scores it below `classifier_threshold`.
+    In "shadow" mode decisions are recorded but retrieval always runs, so the
+    rules can be tuned from /admin/metrics before they take effect.
+    """
+
+    def __init__(self, mode="on", classifier=None, classifier_threshold=0.2):
+        self.mode = mode
+        self.classifier = classifier
+        self.classifier_threshold = classifier_threshold
+        self._lock = threading.Lock()
+        self._counts = Counter()
+        self._recent = deque(maxlen=RECENT_DECISIONS)
+
+    def _evaluate(self, message):
+        text = message.strip()
+        if not text:
+            return False, "empty"
+        for reason, pattern in SKIP_RULES:
+            if pattern.match(text):
+                return False, reason
+
+        if self.classifier:
+            try:
+                score = float(self.classifier(text))
+                if score < self.classifier_threshold:
+                    return False, "classifier"
+            except Exception as e:
+                print(f"⚠️  Retrieval gate classifier failed: {e}")
+        return True, "default"
+
+    def should_retrieve(self, user_message):
+        """Return (retrieve, reason) for a user turn and record the decision"""
+        if self.mode == "off":
+            return True, "gate_off"
+
+        retrieve, reason = self._evaluate(user_message or "")
+        with self._lock:
+            self._counts["retrieve" if retrieve else "skip"] += 1
+            self._counts[f"reason:{reason}"] += 1
+            self._recent.append({
+                "at": datetime.now().isoformat(timespec='seconds'),
+                "message": _redact((user_message or "")[:80]),
+                "retrieve": retrieve,
+                "reason": reason
+            })
+
+        if not retrieve:
+            if self.mode == "shadow":
+                print(f"ℹ️  Retrieval gate (shadow) would skip: {reason}")
+                return True, f"shadow:{reason}"
+            print(f"⏭️  Retrieval skipped by gate: {reason}")
+        return retrieve, reason
+
+    def stats(self):
+        with self._lock:
+            decisions = self._counts["retrieve"] + self._counts["skip"]
+            return {
+                "mode": self.mode,
+                "classifier": getattr(self.classifier, "__name__", None) if self.classifier else None,
+                "decisions": decisions,
+                "retrieved": self._counts["retrieve"],
+                "skipped": self._counts["skip"],
+                "skip_rate": round(self._counts["skip"] / decisions, 4) if decisions else 0.0,
+                "reasons": {key[len("reason:"):]: count for key, count in self._counts.items() if key.startswith("reason:")},
+                "recent": list(self._recent)
+            }
+
+
+def load_classifier(spec):
+    """Import a "module:function" classifier, returning None if it can't be loaded"""
+    if not spec:
+        return None
+    try:
+        module_name, function_name = spec.split(":", 1)
+        return getattr(importlib.import_module(module_name), function_name)
+    except Exception as e:
+        print(f"⚠️  Failed to load retrieval gate classifier {spec}: {e}")
+        return None
+
+
+_config = get_retrieval_gate_config()
+
+# Create global instance
+retrieval_gate = RetrievalGate(
+    _config['mode'], load_classifier(_config['classifier']), _config['classifier_threshold']
+)
@@ -0,0 +1,53 @@
+import json
+
+from chatbot.chatbot import QUOTE_FORM_TRIGGER
+
+
+class QuoteTriggerFilter:
+    """Strip [QUOTE_FORM_TRIGGER] from a stream of text chunks.
+
+    The marker can be split across chunks ("[QUOTE_FO" + "RM_TRIGGER]"), so
+    any trailing text that could be the start of it is held back until the
+    next chunk shows whether it is. `triggered` records whether the marker
+    was seen and `text` is the full filtered answer.
+    """
+
+    def __init__(self, marker=QUOTE_FORM_TRIGGER):
+        self.marker = marker
+        self.triggered = False
+        self._pending = ""
+        self._parts = []
+
+    def feed(self, chunk):
+        """Return the part of the stream that is safe to send now"""
+        text = self._pending + chunk
+        if self.marker in text:
+            text = text.replace(self.marker, "")
+            self.triggered = True
+
+        held = 0
+        for length in range(min(len(self.marker) - 1, len(text)), 0, -1):
+            if text.endswith(self.marker[:length]):
+                held = length
+                break
+
+        safe_text = text[:len(text) - held]
+        self._pending = text[len(text) - held:]
+        self._parts.append(safe_text)
+        return safe_text
+
+    def flush(self):
+        """Release held-back text at the end of the stream (it was not the marker)"""
+        remaining = self._pending
+        self._pending = ""
+        self._parts.append(remaining)
+        return remaining
+
+    @property
+    def text(self):
+        return "".join(self._parts)
+
+
+def format_sse(event, data):
+    """Encode one server-sent event with a JSON payload"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
@@ -0,0 +1,200 @@
+import bisect
+import threading
+from collections import Counter, OrderedDict
+from datetime import datetime
+
+from environment import get_usage_config
+from mongodb_operations import mongodb_manager
+
+# USD per million tokens; update when OpenAI changes prices
+MODEL_PRICES_PER_MILLION = {
+    "gpt-4o-mini": {"input": 0.15, "cached_input": 0.075, "output": 0.60},
+    "gpt-4o": {"input": 2.50, "cached_input": 1.25, "output": 10.00},
+}
+
+DURATION_BUCKETS_MS = (25, 50, 100, 250, 500, 1000, 2000, 4000, 8000, 16000, 32000)
+TOKEN_BUCKETS = (100, 250, 500, 1000, 2000, 4000, 8000, 16000)
+COST_BUCKETS_USD = (0.0001, 0.0002, 0.0005, 0.001, 0.002, 0.005, 0.01)
+
+
+def estimate_cost(model, prompt_tokens, completion_tokens, cached_prompt_tokens=0):
+    """Estimated USD cost of one call, or None for a model without a price"""
+    prices = MODEL_PRICES_PER_MILLION.get(model)
+    if not prices:
+        return None
+    uncached = max(0, prompt_tokens - cached_prompt_tokens)
+    return round(
+        (uncached * prices["input"] + cached_prompt_tokens * prices["cached_input"]
+         + completion_tokens * prices["output"]) / 1_000_000,
+        8
+    )
+
+
+def build_turn_record(model, durations, usage=None, prompt_sections=None, **details):
+    """
+    Turn one chat turn's measurements into a usage record.
+
+    durations are seconds per stage; usage is the API's usage object (None
+    when no model call was made, e.g. an answer cache hit).
+    """
+    prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+    completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+    cached_prompt_tokens = getattr(getattr(usage, "prompt_tokens_details", None), "cached_tokens", 0) or 0
+    return {
+        "timestamp": datetime.utcnow().isoformat() + "Z",
+        "model": model if usage is not None else None,
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "cached_prompt_tokens": cached_prompt_tokens,
+        "cost_usd": estimate_cost(model, prompt_tokens, completion_tokens, cached_prompt_tokens) or 0.0,
+        "durations_ms": {stage: round(seconds * 1000, 1) for stage, seconds in durations.items()},
+        "prompt_sections": prompt_sections or {},
+        **details
+    }
+
+
+class Histogram:
+    """Fixed-bucket histogram; percentiles are reported as bucket upper bounds"""
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def percentile(self, fraction):
+        if not self.count:
+            return None
+        threshold = fraction * self.count
+        seen = 0
+        for position, count in enumerate(self.counts):
+            seen += count
+            if seen >= threshold:
+                return self.bounds[position] if position < len(self.bounds) else self.max
+        return self.max
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "mean": round(self.total / self.count, 6) if self.count else None,
+            "p50": self.percentile(0.5),
+            "p95": self.percentile(0.95),
+            "p99": self.percentile(0.99),
+            "max": round(self.max, 6),
+            "buckets": {
+                (f"le_{bound}" if position < len(self.bounds) else "inf"): count
+                for position, (bound, count) in enumerate(zip(list(self.bounds) + [None], self.counts))
+            }
+        }
+
+
+class UsageTracker:
+    """Aggregate per-turn token, cost and latency records in process and store them per session.
+
+    Every turn updates histograms of stage durations, token counts and cost,
+    totals of estimated tokens per prompt section, and a bounded table of the
+    most expensive sessions. Records wait in memory until flush_session is
+    called after the session document has been saved, so usage writes never
+    race the session save or create a document of their own.
+    """
+
+    def __init__(self, persist=True, max_records_per_session=200, max_sessions=5000):
+        self.persist = persist
+        self.max_records_per_session = max_records_per_session
+        self.max_sessions = max_sessions
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._totals = Counter()
+        self._section_tokens = Counter()
+        self._session_costs = OrderedDict()
+        self._pending = OrderedDict()
+
+    def _observe(self, name, bounds, value):
+        if name not in self._histograms:
+            self._histograms[name] = Histogram(bounds)
+        self._histograms[name].observe(value)
+
+    def record_turn(self, session_id, record):
+        """Record a chat turn, or a background model call made for the session (kind="summary")"""
+        is_turn = record.get("kind", "turn") == "turn"
+        with self._lock:
+            for stage, milliseconds in record["durations_ms"].items():
+                self._observe(f"duration_ms.{stage}", DURATION_BUCKETS_MS, milliseconds)
+            if record["model"] and is_turn:
+                self._observe("prompt_tokens", TOKEN_BUCKETS, record["prompt_tokens"])
+                self._observe("completion_tokens", TOKEN_BUCKETS, record["completion_tokens"])
+                self._observe("cost_usd", COST_BUCKETS_USD, record["cost_usd"])
+            self._totals.update({
+                "turns": 1 if is_turn else 0,
+                "summary_calls": 0 if is_turn else 1,
+                "model_calls": 1 if record["model"] else 0,
+                "prompt_tokens": record["prompt_tokens"],
+                "completion_tokens": record["completion_tokens"],
+                "cached_prompt_tokens": record["cached_prompt_tokens"]
+            })
+            self._totals["cost_usd"] += record["cost_usd"]
+            self._section_tokens.update(record["prompt_sections"])
+
+            session = self._session_costs.pop(session_id, {"turns": 0, "cost_usd": 0.0, "prompt_tokens": 0})
+            session["turns"] += 1 if is_turn else 0
+            session["cost_usd"] += record["cost_usd"]
+            session["prompt_tokens"] += record["prompt_tokens"]
+            self._session_costs[session_id] = session
+            if len(self._session_costs) > self.max_sessions:
+                self._session_costs.popitem(last=False)
+
+            if self.persist:
+                pending = self._pending.pop(session_id, [])
+                self._pending[session_id] = (pending + [record])[-self.max_records_per_session:]
+                if len(self._pending) > self.max_sessions:
+                    self._pending.popitem(last=False)
+
+        print(f"📈 {'Turn' if is_turn else 'Summary'} usage for session {session_id}: {record['prompt_tokens']} prompt + "
+              f"{record['completion_tokens']} completion tokens, ${record['cost_usd']:.5f}, "
+              f"{record['durations_ms'].get('total', sum(record['durations_ms'].values())):.0f} ms")
+
+    def flush_session(self, session_id):
+        """Store the session's pending records; call once its session document exists"""
+        with self._lock:
+            records = self._pending.pop(session_id, [])
+        for record in records:
+            try:
+                result = mongodb_manager.add_turn_usage(session_id, record, self.max_records_per_session)
+                if not result.get("success"):
+                    print(f"⚠️  Turn usage not stored for session {session_id}: {result.get('error')}")
+            except Exception as e:
+                print(f"⚠️  Failed to store turn usage for session {session_id}: {e}")
+        return len(records)
+
+    def stats(self, top_sessions=10):
+        with self._lock:
+            section_total = sum(self._section_tokens.values())
+            return {
+                "totals": {key: round(value, 6) for key, value in self._totals.items()},
+                "histograms": {name: histogram.summary() for name, histogram in sorted(self._histograms.items())},
+                "prompt_section_tokens": {
+                    section: {"total": tokens, "share": round(tokens / section_total, 4) if section_total else 0.0}
+                    for section, tokens in self._section_tokens.most_common()
+                },
+                "top_sessions_by_cost": [
+                    {"session_id": session_id, **{key: round(value, 6) for key, value in values.items()}}
+                    for session_id, values in sorted(
+                        self._session_costs.items(), key=lambda item: item[1]["cost_usd"], reverse=True
+                    )[:top_sessions]
+                ]
+            }
+
+
+_config = get_usage_config()
+
+# Create global instance (None when USAGE_TRACKING_ENABLED=false)
+usage_tracker = (
+    UsageTracker(_config['persist'], _config['max_records_per_session']) if _config['enabled'] else None
+)
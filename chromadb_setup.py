@@ -1,10 +1,39 @@
 import chromadb
-from chromadb.utils import embedding_functions
+from chromadb.api.types import EmbeddingFunction
 
-def initialize_chromadb(openai_key, path="chroma_persistent_storage", collection_name="document_qa_collection"):
-    openai_ef = embedding_functions.OpenAIEmbeddingFunction(
-        api_key=openai_key, model_name="text-embedding-3-small"
-    )
+from embeddings.embedding_generation import EMBEDDING_MODEL, get_cached_openai_embeddings
+from embeddings.query_embedding_cache import query_embedding_cache
+
+
+class CachedOpenAIEmbeddingFunction(EmbeddingFunction):
+    """Chroma embedding function for query texts.
+
+    Lookups go through the in-process query LRU, then the persistent
+    embedding cache, and only then the embeddings API.
+    """
+
+    def __init__(self, openai_key):
+        from openai import OpenAI
+        self._client = OpenAI(api_key=openai_key)
+
+    def __call__(self, input):
+        texts = list(input)
+        if not query_embedding_cache:
+            return get_cached_openai_embeddings(self._client, texts)
+
+        embeddings = [query_embedding_cache.get(EMBEDDING_MODEL, text) for text in texts]
+        missing = [position for position, embedding in enumerate(embeddings) if embedding is None]
+        if missing:
+            fresh_embeddings = get_cached_openai_embeddings(self._client, [texts[position] for position in missing])
+            for position, embedding in zip(missing, fresh_embeddings):
+                query_embedding_cache.put(EMBEDDING_MODEL, texts[position], embedding)
+                embeddings[position] = embedding
+        return embeddings
+
+
+def initialize_chromadb(openai_key, path="chroma_persistent_storage", collection_name="document_qa_collection",
+                        embedding_function=None):
+    openai_ef = embedding_function or CachedOpenAIEmbeddingFunction(openai_key)
     chroma_client = chromadb.PersistentClient(path=path)
     collection = chroma_client.get_or_create_collection(
         name=collection_name, embedding_function=openai_ef
@@ -1,6 +1,28 @@
-def upsert_documents_into_db(collection, chunked_documents):
-    for doc in chunked_documents:
-        print("==== Inserting chunks into db;;; ====")
-        collection.upsert(
-            ids=[doc["id"]], documents=[doc["text"]], embeddings=[doc["embedding"]]
-        )
+UPSERT_BATCH_SIZE = 256
+
+def build_chunk_metadata(doc):
+    """Chroma metadata values must be str/int/float/bool, so drop anything missing"""
+    metadata = {
+        "source_file": doc.get("source_file"),
+        "chunk_index": doc.get("chunk_index"),
+        "token_count": doc.get("token_count"),
+        "content_hash": doc.get("content_hash")
+    }
+    return {key: value for key, value in metadata.items() if value is not None}
+
+def upsert_documents_into_db(collection, chunked_documents, batch_size=UPSERT_BATCH_SIZE):
+    """Upsert chunks in batches so each Chroma transaction covers many chunks"""
+    total = len(chunked_documents)
+    for start in range(0, total, batch_size):
+        batch = chunked_documents[start:start + batch_size]
+        print(f"==== Inserting chunks {start + 1}-{start + len(batch)} of {total} into db ====")
+        metadatas = [build_chunk_metadata(doc) for doc in batch]
+        upsert_kwargs = {
+            "ids": [doc["id"] for doc in batch],
+            "documents": [doc["text"] for doc in batch],
+            "embeddings": [doc["embedding"] for doc in batch]
+        }
+        # Chroma rejects empty metadata dicts, so only send them when every chunk has some
+        if all(metadatas):
+            upsert_kwargs["metadatas"] = metadatas
+        collection.upsert(**upsert_kwargs)
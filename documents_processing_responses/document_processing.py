@@ -1,103 +1,154 @@
 import os
-import PyPDF2
-import io
+import hashlib
+from documents_processing_responses.text_chunker import (
+    split_text, approximate_token_count, chunk_statistics, CHUNK_SIZE_TOKENS, CHUNK_OVERLAP_TOKENS
+)
 
-def load_documents_from_directory(directory_path):
+PDF_PAGES_PER_TASK = 16
+
+def _load_text_file(file_path):
+    with open(file_path, "r", encoding="utf-8") as file:
+        return file.read()
+
+def _count_pdf_pages(file_path):
+    import PyPDF2
+    with open(file_path, "rb") as file:
+        return len(PyPDF2.PdfReader(file).pages)
+
+def _extract_pdf_pages(file_path, start_page, end_page):
+    """Extract text for pages [start_page, end_page); runs inside a worker process"""
+    import PyPDF2
+    with open(file_path, "rb") as file:
+        pdf_reader = PyPDF2.PdfReader(file)
+        return start_page, [(pdf_reader.pages[i].extract_text() or "") for i in range(start_page, end_page)]
+
+def _pdf_document(filename, page_texts):
+    """Join extracted pages into a document, or None when the PDF has no text"""
+    text_content = "\n".join(page_texts) + "\n"
+    if not text_content.strip():
+        print(f"Warning: No text content found in PDF: {filename}")
+        return None
+    print(f"Loaded PDF file: {filename} ({len(page_texts)} pages)")
+    return {"id": filename, "text": text_content}
+
+def iter_documents_from_directory(directory_path, max_workers=None, pages_per_task=PDF_PAGES_PER_TASK, processes=False):
+    """
+    Yield {"id", "text"} documents as soon as each one is extracted.
+
+    Text files are yielded straight away. With processes=True (build_index.py)
+    PDFs are split into page ranges that are extracted in a process pool, and
+    each PDF is yielded as soon as all of its ranges finish, so chunking can
+    start before the whole corpus is read. Otherwise PDFs are extracted in this
+    process: the web server reindexes from a multi-threaded process, where
+    forking a pool can deadlock the children.
+    """
     print("==== Loading documents from directory ====")
-    documents = []
-    for filename in os.listdir(directory_path):
+    pdf_files = []
+    for filename in sorted(os.listdir(directory_path)):
         file_path = os.path.join(directory_path, filename)
-        
+
         if filename.endswith(".txt"):
             try:
-                with open(file_path, "r", encoding="utf-8") as file:
-                    documents.append({"id": filename, "text": file.read()})
+                text = _load_text_file(file_path)
                 print(f"Loaded text file: {filename}")
+                yield {"id": filename, "text": text}
             except Exception as e:
                 print(f"Error loading text file {filename}: {e}")
-                
+
         elif filename.endswith(".pdf"):
+            pdf_files.append((filename, file_path))
+
+    if not pdf_files:
+        return
+
+    if not processes:
+        for filename, file_path in pdf_files:
             try:
-                with open(file_path, "rb") as file:
-                    pdf_reader = PyPDF2.PdfReader(file)
-                    text_content = ""
-                    
-                    for page_num in range(len(pdf_reader.pages)):
-                        page = pdf_reader.pages[page_num]
-                        text_content += page.extract_text() + "\n"
-                    
-                    if text_content.strip():
-                        documents.append({"id": filename, "text": text_content})
-                        print(f"Loaded PDF file: {filename} ({len(pdf_reader.pages)} pages)")
-                    else:
-                        print(f"Warning: No text content found in PDF: {filename}")
-                        
+                _, page_texts = _extract_pdf_pages(file_path, 0, _count_pdf_pages(file_path))
             except Exception as e:
                 print(f"Error loading PDF file {filename}: {e}")
-                
+                continue
+            document = _pdf_document(filename, page_texts)
+            if document:
+                yield document
+        return
+
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        pending = {}
+        futures = {}
+        for filename, file_path in pdf_files:
+            try:
+                page_count = _count_pdf_pages(file_path)
+            except Exception as e:
+                print(f"Error loading PDF file {filename}: {e}")
+                continue
+            if page_count == 0:
+                print(f"Warning: No text content found in PDF: {filename}")
+                continue
+            pending[filename] = {"pages": [None] * page_count, "remaining": 0}
+            for start_page in range(0, page_count, pages_per_task):
+                end_page = min(start_page + pages_per_task, page_count)
+                future = executor.submit(_extract_pdf_pages, file_path, start_page, end_page)
+                futures[future] = filename
+                pending[filename]["remaining"] += 1
+
+        for future in as_completed(futures):
+            filename = futures[future]
+            state = pending.get(filename)
+            if state is None:
+                continue  # an earlier range of this PDF already failed
+            try:
+                start_page, page_texts = future.result()
+            except Exception as e:
+                print(f"Error loading PDF file {filename}: {e}")
+                del pending[filename]
+                continue
+
+            state["pages"][start_page:start_page + len(page_texts)] = page_texts
+            state["remaining"] -= 1
+            if state["remaining"]:
+                continue
+
+            del pending[filename]
+            document = _pdf_document(filename, state["pages"])
+            if document:
+                yield document
+
+def load_documents_from_directory(directory_path, max_workers=None, processes=False):
+    documents = list(iter_documents_from_directory(directory_path, max_workers, processes=processes))
     print(f"Total documents loaded: {len(documents)}")
     return documents
 
-def split_text(text, chunk_size=1000, chunk_overlap=20):
-    """
-    Split text into chunks with overlap, trying to break at sentence boundaries when possible
-    """
-    chunks = []
-    start = 0
-    
-    # Clean up the text
-    text = text.strip()
-    
-    while start < len(text):
-        end = start + chunk_size
-        
-        # If we're not at the end of the text, try to find a good breaking point
-        if end < len(text):
-            # Look for sentence endings within the last 100 characters of the chunk
-            search_start = max(start, end - 100)
-            search_end = min(end + 100, len(text))
-            
-            # Find the last sentence ending in this range
-            last_period = text.rfind('.', search_start, end)
-            last_exclamation = text.rfind('!', search_start, end)
-            last_question = text.rfind('?', search_start, end)
-            last_newline = text.rfind('\n', search_start, end)
-            
-            # Find the best breaking point
-            break_points = [last_period, last_exclamation, last_question, last_newline]
-            valid_breaks = [p for p in break_points if p > start]
-            
-            if valid_breaks:
-                best_break = max(valid_breaks)
-                if best_break > start:
-                    end = best_break + 1  # Include the punctuation
-        
-        chunk = text[start:end].strip()
-        if chunk:  # Only add non-empty chunks
-            chunks.append(chunk)
-        
-        start = end - chunk_overlap
-        if start >= len(text):
-            break
-    
-    return chunks
-
-def preprocess_documents(documents, chunk_size=1000, chunk_overlap=20):
+def compute_content_hash(text):
+    """Return a stable SHA-256 hex digest for a piece of text"""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def iter_document_chunks(doc, chunk_size=CHUNK_SIZE_TOKENS, chunk_overlap=CHUNK_OVERLAP_TOKENS, count_tokens=None):
+    """Yield chunk dicts for a single document; sizes are in tokens"""
+    count_tokens = count_tokens or approximate_token_count
+    chunks = split_text(doc["text"], chunk_size, chunk_overlap, count_tokens)
+    print(f"Split {doc['id']} into {len(chunks)} chunks")
+
+    for i, chunk in enumerate(chunks):
+        yield {
+            "id": f"{doc['id']}_chunk{i+1}",
+            "text": chunk,
+            "source_file": doc['id'],
+            "chunk_index": i,
+            "token_count": count_tokens(chunk),
+            "content_hash": compute_content_hash(chunk)
+        }
+
+def preprocess_documents(documents, chunk_size=CHUNK_SIZE_TOKENS, chunk_overlap=CHUNK_OVERLAP_TOKENS, count_tokens=None):
+    """Chunk documents from any iterable, including iter_documents_from_directory"""
     print("==== Preprocessing documents into chunks ====")
     chunked_documents = []
-    total_chunks = 0
-    
+
     for doc in documents:
-        chunks = split_text(doc["text"], chunk_size, chunk_overlap)
-        print(f"Split {doc['id']} into {len(chunks)} chunks")
-        
-        for i, chunk in enumerate(chunks):
-            chunked_documents.append({
-                "id": f"{doc['id']}_chunk{i+1}", 
-                "text": chunk,
-                "source_file": doc['id']
-            })
-        total_chunks += len(chunks)
-    
-    print(f"Total chunks created: {total_chunks}")
+        chunked_documents.extend(iter_document_chunks(doc, chunk_size, chunk_overlap, count_tokens))
+
+    print(f"Total chunks created: {len(chunked_documents)}")
+    print(f"Chunk size stats: {chunk_statistics([chunk['token_count'] for chunk in chunked_documents])}")
     return chunked_documents
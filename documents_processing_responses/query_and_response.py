@@ -1,8 +1,21 @@
-def query_documents(collection, questions, n_results=2):
-    print("Querying Chroma...")
+def query_documents(collection, questions, n_results=2, include_scores=False):
+    """
+    Query any retrieval backend with the Chroma collection API (ChromaDB or NumpyVectorIndex).
+
+    Returns the chunk texts, or with include_scores=True dicts with the
+    chunk "id", "document" and "distance".
+    """
+    print("Querying knowledge base...")
     try:
         results = collection.query(query_texts=questions, n_results=n_results)
-        relevant_chunk = [doc for sublist in results["documents"] for doc in sublist]
+        if include_scores:
+            relevant_chunk = [
+                {"id": chunk_id, "document": doc, "distance": distance}
+                for ids, docs, distances in zip(results["ids"], results["documents"], results["distances"])
+                for chunk_id, doc, distance in zip(ids, docs, distances)
+            ]
+        else:
+            relevant_chunk = [doc for sublist in results["documents"] for doc in sublist]
         print("Returned relevant chunks")
         return relevant_chunk
     except Exception as e:
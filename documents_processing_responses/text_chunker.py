@@ -0,0 +1,188 @@
+import re
+
+# Chunk sizes are measured in tokens, not characters, so retrieved context
+# fits a predictable share of the prompt budget.
+CHUNK_SIZE_TOKENS = 256
+CHUNK_OVERLAP_TOKENS = 24
+
+_SENTENCE_PATTERN = re.compile(r'.+?(?:[.!?]+["\')\]]*(?=\s|$)|$)\s*|\s+')
+_WORD_PATTERN = re.compile(r'\S+\s*')
+_HEADING_MAX_CHARS = 80
+_HEADING_MAX_WORDS = 10
+
+
+def approximate_token_count(text):
+    """Fast local estimate (~4 characters per token for English text)"""
+    return max(1, (len(text) + 3) // 4)
+
+
+def get_token_counter(encoding_name=None):
+    """
+    Return a callable text -> token count.
+
+    With an encoding name (e.g. "cl100k_base") and tiktoken installed, counts
+    are exact; otherwise the fast approximation is used.
+    """
+    if encoding_name:
+        try:
+            import tiktoken
+            encoding = tiktoken.get_encoding(encoding_name)
+            return lambda text: len(encoding.encode(text, disallowed_special=()))
+        except Exception as e:
+            print(f"⚠️  Tokenizer '{encoding_name}' unavailable ({e}) - using approximate token counts")
+    return approximate_token_count
+
+
+def _is_heading(line):
+    stripped = line.strip()
+    if not stripped:
+        return False
+    if len(stripped) > _HEADING_MAX_CHARS or len(stripped.split()) > _HEADING_MAX_WORDS:
+        return False
+    if stripped.startswith("#"):
+        return True
+    return (
+        stripped[-1] not in ".!?,;:"
+        and not stripped.startswith(("Q:", "A:", "-", "•"))
+    )
+
+
+def _hard_split(text, start, count_tokens, max_tokens):
+    """Last resort for a run without whitespace (URL, base64): cut it into pieces of at most max_tokens"""
+    position = 0
+    while position < len(text):
+        # Longest prefix of the remainder that fits, found by binary search
+        low, high = position + 1, len(text)
+        while low < high:
+            middle = (low + high + 1) // 2
+            if count_tokens(text[position:middle]) <= max_tokens:
+                low = middle
+            else:
+                high = middle - 1
+        yield start + position, start + low, count_tokens(text[position:low])
+        position = low
+
+
+def _split_oversize(text, start, count_tokens, max_tokens):
+    """Split a unit longer than max_tokens at word boundaries, hard-splitting words that are too long themselves"""
+    piece_start = start
+    piece_tokens = 0
+    for word in _WORD_PATTERN.finditer(text):
+        word_start = start + word.start()
+        word_tokens = count_tokens(word.group(0))
+        if piece_tokens and piece_tokens + word_tokens > max_tokens:
+            yield piece_start, word_start, piece_tokens
+            piece_start, piece_tokens = word_start, 0
+        if word_tokens > max_tokens:
+            yield from _hard_split(word.group(0), word_start, count_tokens, max_tokens)
+            piece_start = start + word.end()
+            continue
+        piece_tokens += word_tokens
+    if piece_tokens:
+        yield piece_start, start + len(text), piece_tokens
+
+
+def _iter_units(text, count_tokens, max_tokens):
+    """
+    Yield (start, end, tokens, is_heading) spans covering the text in order.
+
+    Heading lines are single units; other lines are split into sentences. Any
+    unit longer than max_tokens is split further at word boundaries, and a
+    single run without whitespace by token count, so no unit exceeds it.
+    """
+
+    def units(unit_text, start, is_heading):
+        tokens = count_tokens(unit_text)
+        if tokens <= max_tokens:
+            yield start, start + len(unit_text), tokens, is_heading
+            return
+        for piece_start, piece_end, piece_tokens in _split_oversize(unit_text, start, count_tokens, max_tokens):
+            yield piece_start, piece_end, piece_tokens, False
+
+    position = 0
+    for line in text.splitlines(keepends=True):
+        line_start = position
+        position += len(line)
+
+        if _is_heading(line):
+            yield from units(line, line_start, True)
+            continue
+
+        for match in _SENTENCE_PATTERN.finditer(line):
+            if match.group(0):
+                yield from units(match.group(0), line_start + match.start(), False)
+
+
+def split_text(text, chunk_size=CHUNK_SIZE_TOKENS, chunk_overlap=CHUNK_OVERLAP_TOKENS, count_tokens=None):
+    """
+    Split text into chunks of at most chunk_size tokens in a single linear pass.
+
+    Chunks break at sentence ends, and a heading line starts a new chunk once
+    the current one is reasonably full. Consecutive chunks share up to
+    chunk_overlap tokens of whole trailing sentences.
+    """
+    count_tokens = count_tokens or approximate_token_count
+    text = text.strip()
+    chunks = []
+    window = []  # (start, end, tokens, is_heading) units of the open chunk
+    window_tokens = 0
+    new_units = 0  # units in the window that were not carried over as overlap
+    min_tokens_before_heading = chunk_size // 4
+
+    def flush():
+        nonlocal window, window_tokens, new_units
+        chunk = text[window[0][0]:window[-1][1]].strip()
+        if chunk:
+            chunks.append(chunk)
+
+        overlap = []
+        overlap_tokens = 0
+        for unit in reversed(window):
+            if unit[3] or overlap_tokens + unit[2] > chunk_overlap:
+                break
+            overlap.append(unit)
+            overlap_tokens += unit[2]
+        overlap.reverse()
+        window, window_tokens, new_units = overlap, overlap_tokens, 0
+
+    for unit in _iter_units(text, count_tokens, chunk_size):
+        start, end, tokens, is_heading = unit
+        if new_units:
+            starts_section = is_heading and window_tokens >= min_tokens_before_heading
+            if starts_section or window_tokens + tokens > chunk_size:
+                flush()
+        if window and window_tokens + tokens > chunk_size:
+            # Carried-over overlap would push this unit past the limit
+            window, window_tokens = [], 0
+        if is_heading and not new_units:
+            # Overlap never bridges into a new section
+            window, window_tokens = [], 0
+
+        window.append(unit)
+        window_tokens += tokens
+        new_units += 1
+
+    if new_units:
+        flush()
+
+    return chunks
+
+
+def chunk_statistics(token_counts):
+    """Summarise chunk sizes (in tokens) for logging and tuning"""
+    if not token_counts:
+        return {"count": 0}
+    ordered = sorted(token_counts)
+
+    def percentile(p):
+        return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))]
+
+    return {
+        "count": len(ordered),
+        "min_tokens": ordered[0],
+        "max_tokens": ordered[-1],
+        "mean_tokens": round(sum(ordered) / len(ordered), 1),
+        "p50_tokens": percentile(50),
+        "p95_tokens": percentile(95),
+        "total_tokens": sum(ordered)
+    }
@@ -0,0 +1,144 @@
+import os
+import re
+import time
+import sqlite3
+import hashlib
+import threading
+import unicodedata
+from array import array
+
+from environment import get_embedding_cache_config
+
+_WHITESPACE_PATTERN = re.compile(r'\s+')
+
+
+def normalize_text(text):
+    """Normalise text the same way for every caller so equal content shares a key"""
+    return _WHITESPACE_PATTERN.sub(" ", unicodedata.normalize("NFKC", text)).strip()
+
+
+def make_cache_key(model, dimensions, text):
+    raw_key = f"{model}\x00{dimensions or 'default'}\x00{normalize_text(text)}"
+    return hashlib.sha256(raw_key.encode("utf-8")).digest()
+
+
+def pack_embedding(embedding):
+    """Store vectors as raw float32 bytes (4 bytes per dimension)"""
+    packed = array('f', embedding)
+    if packed.itemsize != 4:
+        raise ValueError("float32 array support is required for the embedding cache")
+    return packed.tobytes()
+
+
+def unpack_embedding(blob):
+    values = array('f')
+    values.frombytes(blob)
+    return values.tolist()
+
+
+class EmbeddingCache:
+    """Persistent embedding cache in a local SQLite file.
+
+    Keys are SHA-256 digests of (model, dimensions, normalised text); values are
+    packed float32 vectors. When the cache grows past max_entries the least
+    recently used tenth is evicted.
+    """
+
+    def __init__(self, path, max_entries=200000):
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key BLOB PRIMARY KEY, vector BLOB NOT NULL, last_access INTEGER NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_access ON embeddings (last_access)")
+
+    def get_many(self, model, dimensions, texts):
+        """Return a list aligned with texts holding cached vectors or None"""
+        keys = [make_cache_key(model, dimensions, text) for text in texts]
+        found = {}
+        with self._lock:
+            for start in range(0, len(keys), 500):
+                batch = keys[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+                ).fetchall()
+                found.update(rows)
+                if rows:
+                    hit_keys = [row[0] for row in rows]
+                    self._conn.execute(
+                        f"UPDATE embeddings SET last_access = ? WHERE key IN ({','.join('?' * len(hit_keys))})",
+                        [int(time.time())] + hit_keys
+                    )
+
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+
+        return [unpack_embedding(found[key]) if key in found else None for key in keys]
+
+    def put_many(self, model, dimensions, texts, embeddings):
+        now = int(time.time())
+        rows = [
+            (make_cache_key(model, dimensions, text), pack_embedding(embedding), now)
+            for text, embedding in zip(texts, embeddings)
+        ]
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO embeddings (key, vector, last_access) VALUES (?, ?, ?)", rows
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._evict_if_needed()
+
+    def _evict_if_needed(self):
+        count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        if count <= self.max_entries:
+            return
+        evict_count = count - int(self.max_entries * 0.9)
+        self._conn.execute(
+            "DELETE FROM embeddings WHERE key IN "
+            "(SELECT key FROM embeddings ORDER BY last_access ASC LIMIT ?)",
+            (evict_count,)
+        )
+        print(f"🧹 Evicted {evict_count} embedding(s) from cache")
+
+    def stats(self):
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        return {"entries": entries, "hits": self.hits, "misses": self.misses}
+
+
+_embedding_cache = None
+_embedding_cache_lock = threading.Lock()
+
+
+def get_embedding_cache():
+    """Return the process-wide embedding cache, or None when disabled or unavailable"""
+    global _embedding_cache
+    if _embedding_cache is None:
+        with _embedding_cache_lock:
+            if _embedding_cache is None:
+                config = get_embedding_cache_config()
+                if not config['enabled']:
+                    _embedding_cache = False
+                else:
+                    try:
+                        _embedding_cache = EmbeddingCache(config['path'], config['max_entries'])
+                        print(f"✅ Embedding cache opened at {config['path']}")
+                    except Exception as e:
+                        print(f"⚠️  Embedding cache unavailable: {e}")
+                        _embedding_cache = False
+    return _embedding_cache or None
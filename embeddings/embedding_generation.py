@@ -1,11 +1,132 @@
+import time
+import random
+from concurrent.futures import ThreadPoolExecutor
+
+from environment import get_embedding_config
+from embeddings.embedding_cache import get_embedding_cache
+
+_embedding_config = get_embedding_config()
+EMBEDDING_MODEL = _embedding_config['model']
+# None keeps the model's native size (1536 for text-embedding-3-small)
+EMBEDDING_DIMENSIONS = _embedding_config['dimensions']
+
+# OpenAI accepts up to 2048 inputs and ~300k tokens per embeddings request;
+# stay well below both so a single slow batch doesn't dominate the run.
+EMBEDDING_BATCH_SIZE = 100
+EMBEDDING_BATCH_MAX_TOKENS = 100000
+
+def estimate_tokens(text):
+    """Cheap token estimate (~4 characters per token for English text)"""
+    return max(1, len(text) // 4)
+
+def _embedding_request_options():
+    return {"dimensions": EMBEDDING_DIMENSIONS} if EMBEDDING_DIMENSIONS else {}
+
 def get_openai_embedding(client, text):
-    response = client.embeddings.create(input=text, model="text-embedding-3-small")
+    response = client.embeddings.create(input=text, model=EMBEDDING_MODEL, **_embedding_request_options())
     embedding = response.data[0].embedding
     print("==== Generating embeddings... ====")
     return embedding
 
-def generate_embeddings(client, chunked_documents):
-    for doc in chunked_documents:
-        print("==== Generating embeddings... ====")
-        doc["embedding"] = get_openai_embedding(client, doc["text"])
+def get_openai_embeddings(client, texts):
+    """Embed a list of texts in one request, returned in input order"""
+    response = client.embeddings.create(input=texts, model=EMBEDDING_MODEL, **_embedding_request_options())
+    return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+def get_cached_openai_embeddings(client, texts, max_retries=3):
+    """Embed texts through the persistent cache, calling the API only for misses"""
+    cache = get_embedding_cache()
+    if not cache:
+        return _embed_batch_with_retry(client, texts, max_retries)
+
+    embeddings = cache.get_many(EMBEDDING_MODEL, EMBEDDING_DIMENSIONS, texts)
+    missing = [position for position, embedding in enumerate(embeddings) if embedding is None]
+    if missing:
+        missing_texts = [texts[position] for position in missing]
+        fresh_embeddings = _embed_batch_with_retry(client, missing_texts, max_retries)
+        cache.put_many(EMBEDDING_MODEL, EMBEDDING_DIMENSIONS, missing_texts, fresh_embeddings)
+        for position, embedding in zip(missing, fresh_embeddings):
+            embeddings[position] = embedding
+    return embeddings
+
+def make_embedding_batches(texts, batch_size=EMBEDDING_BATCH_SIZE, max_batch_tokens=EMBEDDING_BATCH_MAX_TOKENS):
+    """Group text positions into batches bounded by item count and estimated tokens"""
+    batches = []
+    current_batch = []
+    current_tokens = 0
+
+    for position, text in enumerate(texts):
+        tokens = estimate_tokens(text)
+        if current_batch and (len(current_batch) >= batch_size or current_tokens + tokens > max_batch_tokens):
+            batches.append(current_batch)
+            current_batch = []
+            current_tokens = 0
+        current_batch.append(position)
+        current_tokens += tokens
+
+    if current_batch:
+        batches.append(current_batch)
+    return batches
+
+def _embed_batch_with_retry(client, texts, max_retries=3, base_delay=1.0):
+    attempt = 0
+    while True:
+        try:
+            return get_openai_embeddings(client, texts)
+        except Exception as e:
+            attempt += 1
+            if attempt > max_retries:
+                raise
+            delay = base_delay * (2 ** (attempt - 1)) + random.uniform(0, base_delay)
+            print(f"⚠️  Embedding batch of {len(texts)} failed ({e}); retry {attempt}/{max_retries} in {delay:.1f}s")
+            time.sleep(delay)
+
+def generate_embeddings(client, chunked_documents, batch_size=EMBEDDING_BATCH_SIZE,
+                        max_batch_tokens=EMBEDDING_BATCH_MAX_TOKENS, max_workers=1, max_retries=3, use_cache=True):
+    """
+    Embed chunks in size-bounded batches, writing each vector back onto its chunk.
+
+    Chunks that already carry an "embedding" are skipped, so calling this again
+    after a failed run only embeds what is still missing. Vectors found in the
+    persistent embedding cache are reused without an API call. Each batch is retried
+    on its own; with max_workers > 1 several batches are in flight at once.
+    """
+    pending = [doc for doc in chunked_documents if doc.get("embedding") is None]
+    if not pending:
+        return chunked_documents
+
+    cache = get_embedding_cache() if use_cache else None
+    if cache:
+        cached_embeddings = cache.get_many(EMBEDDING_MODEL, EMBEDDING_DIMENSIONS, [doc["text"] for doc in pending])
+        for doc, embedding in zip(pending, cached_embeddings):
+            if embedding is not None:
+                doc["embedding"] = embedding
+        cached_count = len(pending)
+        pending = [doc for doc in pending if doc.get("embedding") is None]
+        cached_count -= len(pending)
+        if cached_count:
+            print(f"♻️  Reused {cached_count} embedding(s) from cache")
+        if not pending:
+            return chunked_documents
+
+    batches = make_embedding_batches([doc["text"] for doc in pending], batch_size, max_batch_tokens)
+    print(f"==== Generating embeddings for {len(pending)} chunks in {len(batches)} batch(es) ====")
+
+    def embed_batch(positions):
+        embeddings = _embed_batch_with_retry(client, [pending[p]["text"] for p in positions], max_retries)
+        for position, embedding in zip(positions, embeddings):
+            pending[position]["embedding"] = embedding
+        if cache:
+            # Cache per batch so a later failure doesn't throw away finished work
+            cache.put_many(EMBEDDING_MODEL, EMBEDDING_DIMENSIONS, [pending[p]["text"] for p in positions], embeddings)
+        return len(positions)
+
+    if max_workers > 1 and len(batches) > 1:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for _ in executor.map(embed_batch, batches):
+                pass
+    else:
+        for positions in batches:
+            embed_batch(positions)
+
     return chunked_documents
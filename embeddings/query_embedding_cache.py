@@ -0,0 +1,80 @@
+import time
+import threading
+from collections import OrderedDict
+
+from environment import get_query_embedding_cache_config
+from embeddings.embedding_cache import normalize_text
+
+
+def normalize_query(text):
+    """Queries differing only in case, spacing or trailing punctuation share an entry"""
+    return normalize_text(text).lower().rstrip("?!. ")
+
+
+class QueryEmbeddingCache:
+    """Bounded in-process LRU of query embeddings with a time-to-live.
+
+    Sits in front of the embedding function on the retrieval path so repeated
+    messages ("hi", "thanks", common questions) skip the embeddings API call.
+    """
+
+    def __init__(self, max_entries=2048, ttl_seconds=3600):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, model, text):
+        key = (model, normalize_query(text))
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, embedding = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return embedding
+                del self._entries[key]
+                self.expirations += 1
+            self.misses += 1
+            return None
+
+    def put(self, model, text, embedding):
+        key = (model, normalize_query(text))
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, embedding)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations
+            }
+
+
+_config = get_query_embedding_cache_config()
+
+# Create global instance (None when disabled)
+query_embedding_cache = (
+    QueryEmbeddingCache(_config['max_entries'], _config['ttl_seconds']) if _config['enabled'] else None
+)
@@ -18,6 +18,14 @@ def load_environment():
     
     return openai_key
 
+def get_openai_key():
+    """Get the OpenAI API key without requiring the web app's other settings"""
+    load_dotenv()
+    openai_key = os.getenv("OPENAI_API_KEY")
+    if not openai_key:
+        raise ValueError("OpenAI API key is missing in the environment variables.")
+    return openai_key
+
 def get_mongodb_uri():
     """Get MongoDB URI from environment variables"""
     load_dotenv()
@@ -92,3 +100,175 @@ def get_hubspot_config():
     return {
         'token': hubspot_token
     }
+
+def get_retrieval_config():
+    """Get knowledge base storage configuration from environment variables"""
+    load_dotenv()
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+
+    # Resolve to absolute paths so every module (and every working directory)
+    # reads and writes the same Chroma files
+    chroma_path = os.getenv('CHROMA_PERSIST_DIR', os.path.join(base_dir, 'chroma_persistent_storage'))
+    data_dir = os.getenv('KNOWLEDGE_BASE_DIR', os.path.join(base_dir, 'data'))
+    index_dir = os.getenv('KB_INDEX_DIR', os.path.join(base_dir, 'index_artifacts'))
+    watch_interval = float(os.getenv('KB_WATCH_INTERVAL', '0'))
+
+    return {
+        'chroma_path': os.path.abspath(chroma_path),
+        'collection_name': os.getenv('CHROMA_COLLECTION_NAME', 'document_qa_collection'),
+        'data_dir': os.path.abspath(data_dir),
+        'index_dir': os.path.abspath(index_dir),
+        # Seconds between checks of data_dir for changed files; 0 disables the watcher
+        'watch_interval': watch_interval,
+        # Rebuild at startup when data/ changed since the active artifact was built (default: with the watcher)
+        'reindex_on_startup': os.getenv('KB_REINDEX_ON_STARTUP', str(watch_interval > 0)).lower() == 'true',
+        # Open a prebuilt index at startup instead of on the first query
+        'warm_up': os.getenv('KB_WARM_UP', 'true').lower() == 'true',
+        # Backend serving published artifacts: "chroma" or "numpy"
+        'backend': os.getenv('RETRIEVAL_BACKEND', 'chroma').lower(),
+        # Fuse BM25 keyword matches with vector results (reciprocal-rank fusion)
+        'hybrid': os.getenv('HYBRID_RETRIEVAL', 'true').lower() == 'true',
+        # Candidates taken from each ranker before fusion
+        'hybrid_candidates': int(os.getenv('HYBRID_CANDIDATES', '8')),
+        # Chunks farther than this squared L2 distance (2 - 2 * cosine) are never used as context
+        'max_distance': float(os.getenv('RETRIEVAL_MAX_DISTANCE', '1.5')),
+        # Token budget for KNOWLEDGE BASE CONTEXT, filled by maximal marginal relevance
+        'context_token_budget': int(os.getenv('RETRIEVAL_TOKEN_BUDGET', '700')),
+        'mmr_lambda': float(os.getenv('RETRIEVAL_MMR_LAMBDA', '0.7')),
+        # Vector storage of the NumPy backend: "none" (float32), "float16" or "int8"
+        'quantization': os.getenv('VECTOR_QUANTIZATION', 'none').lower(),
+        # Quantized scores pick rerank_factor * n_results candidates, re-scored at full precision
+        'rerank_factor': int(os.getenv('QUANTIZED_RERANK_FACTOR', '4'))
+    }
+
+def get_embedding_config():
+    """Get embedding model configuration from environment variables"""
+    load_dotenv()
+    dimensions = os.getenv('EMBEDDING_DIMENSIONS')
+    return {
+        'model': os.getenv('EMBEDDING_MODEL', 'text-embedding-3-small'),
+        # Shortened vectors from the text-embedding-3 models (e.g. 512); unset keeps the model default
+        'dimensions': int(dimensions) if dimensions else None
+    }
+
+def get_embedding_cache_config():
+    """Get persistent embedding cache configuration from environment variables"""
+    load_dotenv()
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    cache_path = os.getenv('EMBEDDING_CACHE_PATH', os.path.join(base_dir, 'embedding_cache', 'embeddings.sqlite3'))
+    return {
+        'enabled': os.getenv('EMBEDDING_CACHE_ENABLED', 'true').lower() == 'true',
+        'path': os.path.abspath(cache_path),
+        'max_entries': int(os.getenv('EMBEDDING_CACHE_MAX_ENTRIES', '200000'))
+    }
+
+def get_query_embedding_cache_config():
+    """Get in-process query embedding cache configuration from environment variables"""
+    load_dotenv()
+    return {
+        'enabled': os.getenv('QUERY_EMBEDDING_CACHE_ENABLED', 'true').lower() == 'true',
+        'max_entries': int(os.getenv('QUERY_EMBEDDING_CACHE_SIZE', '2048')),
+        'ttl_seconds': float(os.getenv('QUERY_EMBEDDING_CACHE_TTL', '3600'))
+    }
+
+def get_semantic_cache_config():
+    """Get semantic answer cache configuration from environment variables (opt-in)"""
+    load_dotenv()
+    return {
+        'enabled': os.getenv('SEMANTIC_CACHE_ENABLED', 'false').lower() == 'true',
+        'similarity_threshold': float(os.getenv('SEMANTIC_CACHE_THRESHOLD', '0.95')),
+        'max_entries': int(os.getenv('SEMANTIC_CACHE_MAX_ENTRIES', '500')),
+        'ttl_seconds': float(os.getenv('SEMANTIC_CACHE_TTL', '86400'))
+    }
+
+def get_llm_response_cache_config():
+    """Get exact-match chat completion cache configuration from environment variables"""
+    load_dotenv()
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    cache_path = os.getenv('LLM_RESPONSE_CACHE_PATH', os.path.join(base_dir, 'llm_response_cache', 'responses.sqlite3'))
+    return {
+        'enabled': os.getenv('LLM_RESPONSE_CACHE_ENABLED', 'true').lower() == 'true',
+        # Skip lookups (always call the model) but keep storing fresh answers
+        'bypass': os.getenv('LLM_RESPONSE_CACHE_BYPASS', 'false').lower() == 'true',
+        'max_entries': int(os.getenv('LLM_RESPONSE_CACHE_SIZE', '1000')),
+        'ttl_seconds': float(os.getenv('LLM_RESPONSE_CACHE_TTL', '86400')),
+        # Optional SQLite tier shared across restarts and worker processes
+        'persist': os.getenv('LLM_RESPONSE_CACHE_PERSIST', 'false').lower() == 'true',
+        'path': os.path.abspath(cache_path),
+        'max_persistent_entries': int(os.getenv('LLM_RESPONSE_CACHE_MAX_PERSISTENT_ENTRIES', '50000'))
+    }
+
+def get_retrieval_gate_config():
+    """Get retrieval gate configuration from environment variables"""
+    load_dotenv()
+    return {
+        # "on" skips retrieval when the gate says so, "shadow" only records decisions, "off" disables the gate
+        'mode': os.getenv('RETRIEVAL_GATE_MODE', 'on').lower(),
+        # Optional classifier as "module:function"; called with the message, returns P(retrieval needed)
+        'classifier': os.getenv('RETRIEVAL_GATE_CLASSIFIER'),
+        'classifier_threshold': float(os.getenv('RETRIEVAL_GATE_CLASSIFIER_THRESHOLD', '0.2'))
+    }
+
+def get_prompt_config():
+    """Get prompt assembly configuration from environment variables"""
+    load_dotenv()
+    return {
+        # Tokens of conversation history sent with each turn
+        'history_token_budget': int(os.getenv('PROMPT_HISTORY_TOKEN_BUDGET', '1500')),
+        # Most recent messages always kept verbatim, even over budget
+        'min_recent_messages': int(os.getenv('PROMPT_MIN_RECENT_MESSAGES', '4')),
+        # tiktoken encoding (e.g. o200k_base) for exact counts; unset uses a fast estimate
+        'token_encoding': os.getenv('PROMPT_TOKEN_ENCODING')
+    }
+
+def get_summary_config():
+    """Get rolling conversation summary configuration from environment variables"""
+    load_dotenv()
+    return {
+        'enabled': os.getenv('SUMMARY_ENABLED', 'true').lower() == 'true',
+        # Summarize once this many messages (or tokens) have aged out of the recent window
+        'trigger_messages': int(os.getenv('SUMMARY_TRIGGER_MESSAGES', '10')),
+        'trigger_tokens': int(os.getenv('SUMMARY_TRIGGER_TOKENS', '1200')),
+        # Newest messages never folded into the summary
+        'keep_recent_messages': int(os.getenv('SUMMARY_KEEP_RECENT_MESSAGES', '6')),
+        'model': os.getenv('SUMMARY_MODEL', 'gpt-4o-mini')
+    }
+
+def get_llm_gateway_config():
+    """Get chat completion admission and retry configuration from environment variables"""
+    load_dotenv()
+    return {
+        # Chat completion calls in flight at once; further calls queue fairly per session
+        'max_concurrency': int(os.getenv('LLM_MAX_CONCURRENCY', '8')),
+        # Retries for rate limits (429), timeouts and 5xx errors
+        'max_retries': int(os.getenv('LLM_MAX_RETRIES', '4')),
+        # Exponential backoff with full jitter: up to base * 2^attempt seconds, capped at max
+        'backoff_base': float(os.getenv('LLM_BACKOFF_BASE', '0.5')),
+        'backoff_max': float(os.getenv('LLM_BACKOFF_MAX', '20'))
+    }
+
+def get_usage_config():
+    """Get token, cost and latency accounting configuration from environment variables"""
+    load_dotenv()
+    return {
+        'enabled': os.getenv('USAGE_TRACKING_ENABLED', 'true').lower() == 'true',
+        # Store each turn's record with the chat session in MongoDB (or the local fallback)
+        'persist': os.getenv('USAGE_PERSIST', 'true').lower() == 'true',
+        # Most recent turn records kept per session; totals cover every turn
+        'max_records_per_session': int(os.getenv('USAGE_MAX_RECORDS_PER_SESSION', '200'))
+    }
+
+def get_asgi_config():
+    """Get configuration for the async (ASGI) entry point in asgi.py"""
+    load_dotenv()
+    return {
+        # Threads for blocking work (retrieval, HubSpot, Sheets, MongoDB); model calls don't use one
+        'blocking_workers': int(os.getenv('ASGI_BLOCKING_WORKERS', '16')),
+        # Threads serving the remaining Flask routes
+        'wsgi_workers': int(os.getenv('ASGI_WSGI_WORKERS', '10'))
+    }
+
+def get_admin_token():
+    """Get the token required by /admin endpoints (admin endpoints are disabled without it)"""
+    load_dotenv()
+    return os.getenv('ADMIN_TOKEN')
@@ -0,0 +1,111 @@
+"""Import-time cost report for the chatbot modules.
+
+Usage:
+    python import_report.py                     # top packages by cumulative import time for `app`
+    python import_report.py chatbot.chatbot     # report for another module
+    python import_report.py --check             # exit 1 if a heavy integration is imported eagerly
+
+The report runs the import in a fresh interpreter with `-X importtime`, so it
+measures real cold-start cost. Importing `app` also runs its startup code, so
+set KB_WARM_UP=false and publish an index artifact to measure imports alone.
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+# Integrations that must only load when their feature is first used
+HEAVY_MODULES = (
+    "gspread",
+    "google.oauth2",
+    "googleapiclient",
+    "dropbox",
+    "PyPDF2",
+    "pymongo",
+    "chromadb",
+)
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def measure_import_times(module_name, python_executable=None):
+    """
+    Import module_name in a fresh interpreter and return -X importtime entries.
+
+    Each entry is {"module", "self_us", "cumulative_us", "depth"} in import order.
+    """
+    result = subprocess.run(
+        [python_executable or sys.executable, "-X", "importtime", "-c", f"import {module_name}"],
+        cwd=PROJECT_DIR,
+        capture_output=True,
+        text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module_name} failed:\n{result.stderr[-2000:]}")
+
+    entries = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        try:
+            self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        except ValueError:
+            continue
+        depth = (len(name) - len(name.lstrip())) // 2
+        entries.append({
+            "module": name.strip(),
+            "self_us": int(self_us),
+            "cumulative_us": int(cumulative_us),
+            "depth": depth
+        })
+    return entries
+
+
+def summarize_by_package(entries):
+    """Total self time per top-level package, largest first"""
+    totals = {}
+    for entry in entries:
+        package = entry["module"].split(".")[0]
+        totals[package] = totals.get(package, 0) + entry["self_us"]
+    return sorted(totals.items(), key=lambda item: item[1], reverse=True)
+
+
+def find_heavy_imports(entries, heavy_modules=HEAVY_MODULES):
+    """Return the heavy modules that were imported, with their cumulative cost in microseconds"""
+    found = {}
+    for entry in entries:
+        for heavy in heavy_modules:
+            if entry["module"] == heavy or entry["module"].startswith(heavy + "."):
+                found[heavy] = max(found.get(heavy, 0), entry["cumulative_us"])
+    return found
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Report import-time cost per package")
+    parser.add_argument("module", nargs="?", default="app", help="Module to import (default: app)")
+    parser.add_argument("--top", type=int, default=20, help="Number of packages to show")
+    parser.add_argument("--check", action="store_true", help="Fail if any heavy integration is imported")
+    args = parser.parse_args(argv)
+
+    entries = measure_import_times(args.module)
+    total_us = sum(entry["self_us"] for entry in entries)
+
+    print(f"📦 Import of '{args.module}': {total_us / 1000:.1f} ms across {len(entries)} modules")
+    for package, self_us in summarize_by_package(entries)[:args.top]:
+        print(f"   {package:<32} {self_us / 1000:9.1f} ms")
+
+    heavy_imports = find_heavy_imports(entries)
+    if heavy_imports:
+        print("⚠️  Heavy integrations imported eagerly:")
+        for module, cumulative_us in heavy_imports.items():
+            print(f"   {module:<32} {cumulative_us / 1000:9.1f} ms")
+    else:
+        print("✅ No heavy integrations imported")
+
+    if args.check and heavy_imports:
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,242 @@
+import os
+import json
+import shutil
+from contextlib import contextmanager
+from datetime import datetime
+
+from documents_processing_responses.document_processing import iter_documents_from_directory, compute_content_hash
+from ingestion.ingestion import sync_knowledge_base, load_manifest, get_manifest_path
+from ingestion.kb_watcher import fingerprint_directory
+
+try:
+    import fcntl
+except ImportError:  # Windows: builds are only serialized within a process
+    fcntl = None
+
+CURRENT_POINTER_FILENAME = "CURRENT"
+ARTIFACT_MANIFEST_FILENAME = "artifact.json"
+BUILD_LOCK_FILENAME = ".build.lock"
+CHROMA_DIRNAME = "chroma"
+NUMPY_DIRNAME = "numpy"
+STAGING_PREFIX = ".staging-"
+
+
+def get_current_version(index_dir):
+    """Return the active artifact version named in CURRENT, or None if nothing is built"""
+    pointer_path = os.path.join(index_dir, CURRENT_POINTER_FILENAME)
+    if not os.path.exists(pointer_path):
+        return None
+    with open(pointer_path, 'r', encoding='utf-8') as f:
+        version = f.read().strip()
+    if version and os.path.isdir(get_artifact_chroma_path(index_dir, version)):
+        return version
+    print(f"⚠️  {pointer_path} points to missing artifact '{version}'")
+    return None
+
+
+def get_artifact_path(index_dir, version):
+    return os.path.join(index_dir, version)
+
+
+def get_artifact_chroma_path(index_dir, version):
+    return os.path.join(index_dir, version, CHROMA_DIRNAME)
+
+
+def get_artifact_numpy_path(index_dir, version):
+    return os.path.join(index_dir, version, NUMPY_DIRNAME)
+
+
+def load_artifact_manifest(index_dir, version):
+    path = os.path.join(get_artifact_path(index_dir, version), ARTIFACT_MANIFEST_FILENAME)
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+class UnsafeIndexBuildError(Exception):
+    """A build that would publish an empty or shrunken index without being asked to"""
+
+
+@contextmanager
+def artifact_build_lock(index_dir, blocking=True):
+    """
+    Exclusive lock on index_dir shared by every process that builds artifacts.
+
+    Yields True when held; with blocking=False it yields False at once if
+    another process is already building.
+    """
+    os.makedirs(index_dir, exist_ok=True)
+    with open(os.path.join(index_dir, BUILD_LOCK_FILENAME), 'a') as lock_file:
+        if fcntl:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                yield False
+                return
+        try:
+            yield True
+        finally:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _file_stats(data_dir):
+    return {name: [size, mtime_ns] for name, size, mtime_ns in fingerprint_directory(data_dir)}
+
+
+def hash_data_files(data_dir):
+    """Content hash per document in data_dir, keyed like the manifest's "files" map"""
+    return {doc["id"]: compute_content_hash(doc["text"]) for doc in iter_documents_from_directory(data_dir)}
+
+
+def artifact_matches_data(index_dir, version, data_dir):
+    """
+    True when the artifact was built from exactly the documents now in data_dir.
+
+    File sizes and mtimes recorded at build time are compared first; contents
+    are only extracted and hashed when those differ.
+    """
+    try:
+        artifact_manifest = load_artifact_manifest(index_dir, version)
+    except Exception as e:
+        print(f"⚠️  Failed to read manifest of index artifact {version}: {e}")
+        return False
+    if artifact_manifest.get("file_stats") == _file_stats(data_dir):
+        return True
+    return artifact_manifest.get("files", {}) == hash_data_files(data_dir)
+
+
+def _check_publishable(summary, current_manifest):
+    """Refuse a build with no chunks, or with fewer files than the active artifact"""
+    if summary["total_chunks"] == 0:
+        raise UnsafeIndexBuildError("Build produced no chunks - keeping the active index artifact")
+    current_files = len(current_manifest.get("files", {})) if current_manifest else 0
+    if summary["files"] < current_files:
+        raise UnsafeIndexBuildError(
+            f"Build has {summary['files']} file(s), fewer than the {current_files} in the active index artifact "
+            f"{current_manifest.get('version')} - not publishing it automatically"
+        )
+
+
+def set_current_version(index_dir, version):
+    """Point CURRENT at a version; os.replace makes the switch atomic for readers"""
+    pointer_path = os.path.join(index_dir, CURRENT_POINTER_FILENAME)
+    tmp_path = pointer_path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(version + "\n")
+    os.replace(tmp_path, pointer_path)
+
+
+def _has_same_embedding_settings(chroma_path):
+    """Vectors can only be reused when they come from the same model and dimensions"""
+    from embeddings.embedding_generation import EMBEDDING_MODEL, EMBEDDING_DIMENSIONS
+
+    settings = load_manifest(get_manifest_path(chroma_path)).get("settings", {})
+    if not settings:
+        return True
+    return (settings.get("embedding_model") == EMBEDDING_MODEL
+            and settings.get("embedding_dimensions") == EMBEDDING_DIMENSIONS)
+
+
+def _new_version_name():
+    return "v" + datetime.now().strftime('%Y%m%d%H%M%S%f')
+
+
+def build_index_artifact(openai_client, openai_key, data_dir, index_dir, collection_name="document_qa_collection",
+                         from_scratch=False, activate=True, seed_chroma_path=None, quantization=None,
+                         refuse_shrink=False, pdf_processes=False):
+    """
+    Build a new versioned index artifact from data_dir.
+
+    The previous active artifact (if any) is copied into a staging directory
+    and synced incrementally, so only new or changed chunks are embedded.
+    seed_chroma_path plays the same role when no artifact exists yet. The
+    finished artifact holds a Chroma snapshot (with its BM25 index), a NumPy
+    export of the same vectors (plus a float16/int8 copy when quantization is
+    set) and artifact.json, and is only published (renamed into place and
+    pointed to by CURRENT) once complete. With refuse_shrink, used by
+    automatic rebuilds, a build with no chunks or fewer files than the active
+    artifact raises UnsafeIndexBuildError instead of being published.
+    pdf_processes extracts PDFs in a process pool (build_index.py only).
+    """
+    from chromadb_setup import initialize_chromadb
+    from retrieval.numpy_backend import export_numpy_index
+
+    os.makedirs(index_dir, exist_ok=True)
+    version = _new_version_name()
+    staging_path = os.path.join(index_dir, STAGING_PREFIX + version)
+    staging_chroma_path = os.path.join(staging_path, CHROMA_DIRNAME)
+
+    active_version = get_current_version(index_dir)
+    active_manifest = load_artifact_manifest(index_dir, active_version) if refuse_shrink and active_version else None
+    previous_version = None if from_scratch else active_version
+    if previous_version and not _has_same_embedding_settings(get_artifact_chroma_path(index_dir, previous_version)):
+        print(f"ℹ️  Embedding model or dimensions changed since {previous_version} - building from scratch")
+        previous_version = None
+    if seed_chroma_path and not _has_same_embedding_settings(seed_chroma_path):
+        seed_chroma_path = None
+
+    if previous_version:
+        print(f"📦 Starting from artifact {previous_version}")
+        shutil.copytree(get_artifact_chroma_path(index_dir, previous_version), staging_chroma_path)
+    elif seed_chroma_path and not from_scratch and os.path.isdir(seed_chroma_path):
+        print(f"📦 Starting from {seed_chroma_path}")
+        shutil.copytree(seed_chroma_path, staging_chroma_path)
+    else:
+        os.makedirs(staging_chroma_path)
+
+    try:
+        collection = initialize_chromadb(openai_key, path=staging_chroma_path, collection_name=collection_name)
+        # Taken before reading the files, so a change made during the build shows up as a mismatch later
+        file_stats = _file_stats(data_dir)
+        summary = sync_knowledge_base(openai_client, collection, data_dir, staging_chroma_path,
+                                      pdf_processes=pdf_processes)
+        if refuse_shrink:
+            _check_publishable(summary, active_manifest)
+        export_numpy_index(collection, os.path.join(staging_path, NUMPY_DIRNAME), quantization)
+
+        ingestion_manifest = load_manifest(get_manifest_path(staging_chroma_path))
+        artifact_manifest = {
+            "version": version,
+            "created_at": datetime.now().isoformat(),
+            "parent_version": previous_version,
+            "collection_name": collection_name,
+            "settings": ingestion_manifest.get("settings", {}),
+            "files": {name: entry.get("file_hash") for name, entry in ingestion_manifest.get("files", {}).items()},
+            "file_stats": file_stats,
+            "summary": summary
+        }
+        with open(os.path.join(staging_path, ARTIFACT_MANIFEST_FILENAME), 'w', encoding='utf-8') as f:
+            json.dump(artifact_manifest, f, indent=2, ensure_ascii=False)
+
+        final_path = get_artifact_path(index_dir, version)
+        os.rename(staging_path, final_path)
+    except Exception:
+        shutil.rmtree(staging_path, ignore_errors=True)
+        raise
+
+    if activate:
+        set_current_version(index_dir, version)
+        print(f"✅ Index artifact {version} built and activated")
+    else:
+        print(f"✅ Index artifact {version} built")
+    return version
+
+
+def prune_index_artifacts(index_dir, keep=3):
+    """Delete all but the newest `keep` artifacts, never touching the active one"""
+    if keep <= 0 or not os.path.isdir(index_dir):
+        return []
+    current_version = get_current_version(index_dir)
+    versions = sorted(
+        name for name in os.listdir(index_dir)
+        if name.startswith("v") and os.path.isdir(os.path.join(index_dir, name))
+    )
+    removed = []
+    for version in versions[:-keep]:
+        if version == current_version:
+            continue
+        shutil.rmtree(get_artifact_path(index_dir, version), ignore_errors=True)
+        removed.append(version)
+    if removed:
+        print(f"🗑️  Pruned index artifacts: {', '.join(removed)}")
+    return removed
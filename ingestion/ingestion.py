@@ -0,0 +1,159 @@
+import os
+import json
+from datetime import datetime
+
+from documents_processing_responses.document_processing import iter_documents_from_directory, iter_document_chunks, compute_content_hash
+from documents_processing_responses.text_chunker import chunk_statistics, CHUNK_SIZE_TOKENS, CHUNK_OVERLAP_TOKENS
+from embeddings.embedding_generation import generate_embeddings, EMBEDDING_MODEL, EMBEDDING_DIMENSIONS
+from db_operations import upsert_documents_into_db
+from retrieval.bm25 import build_bm25_index
+
+MANIFEST_FILENAME = "ingestion_manifest.json"
+MANIFEST_VERSION = 1
+CHUNKER_NAME = "token-linear-v1"
+
+
+def get_manifest_path(storage_path):
+    """Manifest lives next to the Chroma files so it always describes that collection"""
+    return os.path.join(storage_path, MANIFEST_FILENAME)
+
+
+def load_manifest(manifest_path):
+    """Load the ingestion manifest, returning an empty one if missing or unreadable"""
+    empty_manifest = {"version": MANIFEST_VERSION, "settings": {}, "files": {}}
+    if not os.path.exists(manifest_path):
+        return empty_manifest
+
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        if manifest.get("version") != MANIFEST_VERSION:
+            print(f"⚠️  Ingestion manifest version mismatch - rebuilding knowledge base")
+            return empty_manifest
+        return manifest
+    except Exception as e:
+        print(f"⚠️  Failed to read ingestion manifest {manifest_path}: {e}")
+        return empty_manifest
+
+
+def save_manifest(manifest_path, manifest):
+    """Write the manifest atomically so a crash never leaves a half-written file"""
+    os.makedirs(os.path.dirname(manifest_path) or ".", exist_ok=True)
+    tmp_path = manifest_path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, manifest_path)
+
+
+def _manifest_chunk_ids(manifest):
+    chunk_ids = set()
+    for file_entry in manifest.get("files", {}).values():
+        chunk_ids.update(file_entry.get("chunks", {}).keys())
+    return chunk_ids
+
+
+def sync_knowledge_base(client, collection, directory_path, storage_path, chunk_size=CHUNK_SIZE_TOKENS,
+                        chunk_overlap=CHUNK_OVERLAP_TOKENS, pdf_processes=False):
+    """
+    Bring the collection in line with the documents in directory_path.
+
+    Only chunks whose content hash is new or changed are embedded and upserted.
+    Chunks belonging to deleted files, or to files that now produce fewer chunks,
+    are removed from the collection. The BM25 index next to the manifest is
+    rebuilt from the synced collection. pdf_processes extracts PDFs in a
+    process pool; only use it outside the multi-threaded web server.
+    """
+    print("==== Syncing knowledge base ====")
+    manifest_path = get_manifest_path(storage_path)
+    manifest = load_manifest(manifest_path)
+    previous_chunk_ids = _manifest_chunk_ids(manifest)
+    if not previous_chunk_ids and collection.count() > 0:
+        # No manifest describes this collection (e.g. built by the old full
+        # rebuild): treat every stored id as previous, so ids the current
+        # chunking no longer produces are deleted instead of lingering
+        previous_chunk_ids = set(collection.get(include=[])["ids"])
+        print(f"ℹ️  No ingestion manifest for a collection of {len(previous_chunk_ids)} chunk(s) - reconciling ids")
+
+    settings = {
+        "embedding_model": EMBEDDING_MODEL,
+        "chunker": CHUNKER_NAME,
+        "chunk_size": chunk_size,
+        "chunk_overlap": chunk_overlap
+    }
+    if EMBEDDING_DIMENSIONS:
+        settings["embedding_dimensions"] = EMBEDDING_DIMENSIONS
+
+    previous_files = manifest.get("files", {})
+    previous_settings = manifest.get("settings", {})
+    if previous_files and collection.count() > 0 and (
+        previous_settings.get("embedding_model") != EMBEDDING_MODEL
+        or previous_settings.get("embedding_dimensions") != EMBEDDING_DIMENSIONS
+    ):
+        # A Chroma collection keeps the vector size of its first upsert
+        raise ValueError(
+            f"Collection at {storage_path} holds {previous_settings.get('embedding_model')} vectors "
+            f"({previous_settings.get('embedding_dimensions') or 'default'} dims); changing the embedding "
+            f"model or EMBEDDING_DIMENSIONS needs a fresh index (build_index.py --from-scratch)"
+        )
+    if previous_settings != settings:
+        if previous_files:
+            print("ℹ️  Ingestion settings changed - re-embedding all documents")
+        previous_files = {}
+    elif previous_files and collection.count() == 0:
+        print("ℹ️  Collection is empty but manifest exists - re-embedding all documents")
+        previous_files = {}
+
+    # Documents are chunked as they stream in from the loader, so only the
+    # chunks that need embedding are ever held in memory together.
+    files = {}
+    unchanged_files = 0
+    chunks_to_embed = []
+    for doc in iter_documents_from_directory(directory_path, processes=pdf_processes):
+        file_hash = compute_content_hash(doc["text"])
+        previous_entry = previous_files.get(doc["id"])
+        if previous_entry and previous_entry.get("file_hash") == file_hash:
+            files[doc["id"]] = previous_entry
+            unchanged_files += 1
+            continue
+
+        previous_chunks = previous_entry.get("chunks", {}) if previous_entry else {}
+        files[doc["id"]] = {"file_hash": file_hash, "chunks": {}}
+        for chunk in iter_document_chunks(doc, chunk_size, chunk_overlap):
+            files[doc["id"]]["chunks"][chunk["id"]] = chunk["content_hash"]
+            if previous_chunks.get(chunk["id"]) != chunk["content_hash"]:
+                chunks_to_embed.append(chunk)
+
+    print(f"📄 {unchanged_files} unchanged file(s), {len(files) - unchanged_files} new or changed file(s)")
+
+    current_chunk_ids = _manifest_chunk_ids({"files": files})
+    stale_chunk_ids = sorted(previous_chunk_ids - current_chunk_ids)
+
+    if chunks_to_embed:
+        print(f"🧮 Embedding {len(chunks_to_embed)} new or changed chunk(s)")
+        print(f"   Chunk size stats: {chunk_statistics([chunk['token_count'] for chunk in chunks_to_embed])}")
+        chunks_to_embed = generate_embeddings(client, chunks_to_embed)
+        upsert_documents_into_db(collection, chunks_to_embed)
+
+    if stale_chunk_ids:
+        print(f"🗑️  Removing {len(stale_chunk_ids)} stale chunk(s)")
+        collection.delete(ids=stale_chunk_ids)
+
+    manifest = {
+        "version": MANIFEST_VERSION,
+        "settings": settings,
+        "updated_at": datetime.now().isoformat(),
+        "files": files
+    }
+    save_manifest(manifest_path, manifest)
+    # The lexical index is rebuilt over every chunk, so it always matches the collection
+    build_bm25_index(collection, storage_path)
+
+    summary = {
+        "files": len(files),
+        "unchanged_files": unchanged_files,
+        "embedded_chunks": len(chunks_to_embed),
+        "deleted_chunks": len(stale_chunk_ids),
+        "total_chunks": len(current_chunk_ids)
+    }
+    print(f"✅ Knowledge base synced: {summary}")
+    return summary
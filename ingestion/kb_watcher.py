@@ -0,0 +1,69 @@
+import os
+import threading
+
+SUPPORTED_EXTENSIONS = (".txt", ".pdf")
+
+
+def fingerprint_directory(directory_path):
+    """Cheap change signature for the knowledge base: (name, size, mtime) per file"""
+    fingerprint = []
+    for filename in sorted(os.listdir(directory_path)):
+        if not filename.endswith(SUPPORTED_EXTENSIONS):
+            continue
+        stat = os.stat(os.path.join(directory_path, filename))
+        fingerprint.append((filename, stat.st_size, stat.st_mtime_ns))
+    return tuple(fingerprint)
+
+
+class KnowledgeBaseWatcher:
+    """Poll the data directory and hot-reload the knowledge base when it changes.
+
+    Each poll also checks whether another process has published a newer index
+    artifact, so every worker converges on the same version.
+    """
+
+    def __init__(self, retrieval_service, openai_client, interval):
+        self.retrieval_service = retrieval_service
+        self.openai_client = openai_client
+        self.interval = interval
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._fingerprint = None
+
+    def start(self):
+        if self._thread:
+            return
+        self._fingerprint = fingerprint_directory(self.retrieval_service.config['data_dir'])
+        self._thread = threading.Thread(target=self._run, name="kb-watcher", daemon=True)
+        self._thread.start()
+        print(f"👀 Watching {self.retrieval_service.config['data_dir']} every {self.interval:g}s for knowledge base changes")
+
+    def stop(self):
+        self._stop_event.set()
+
+    def _run(self):
+        while not self._stop_event.wait(self.interval):
+            try:
+                self.poll()
+            except Exception as e:
+                print(f"⚠️  Knowledge base watcher error: {e}")
+
+    def poll(self):
+        from ingestion.index_artifacts import UnsafeIndexBuildError
+
+        fingerprint = fingerprint_directory(self.retrieval_service.config['data_dir'])
+        if fingerprint != self._fingerprint:
+            print("📝 Knowledge base files changed - reindexing")
+            try:
+                version = self.retrieval_service.reindex(self.openai_client, refuse_shrink=True)
+            except UnsafeIndexBuildError as e:
+                # Not retried until data/ changes again; POST /admin/reindex publishes it on purpose
+                print(f"⚠️  {e}")
+                self._fingerprint = fingerprint
+                return
+            # Only remember the new state once a reindex actually ran, so a
+            # change that arrives mid-reindex is picked up on the next poll
+            if version is not None:
+                self._fingerprint = fingerprint
+            return
+        self.retrieval_service.refresh_if_stale()
@@ -1,13 +1,33 @@
-from pymongo import MongoClient
 from datetime import datetime
+from contextlib import contextmanager
 import os
 import json
+import threading
 from environment import load_environment
 
+try:
+    import fcntl
+except ImportError:  # Windows: only the in-process session locks apply
+    fcntl = None
+
+# Per-turn usage fields summed into a session's usage_totals
+USAGE_TOTAL_FIELDS = ("prompt_tokens", "completion_tokens", "cached_prompt_tokens", "cost_usd")
+
+# Writes to one session document are serialized on one of these locks (picked by session_id)
+SESSION_LOCK_STRIPES = 64
+CHAT_SESSIONS_LOCK_FILE = "chat_sessions/.lock"
+
+def _usage_count_field(record):
+    """usage_totals counter for a record: chat turns and summary calls are counted apart"""
+    return "summary_calls" if record.get("kind") == "summary" else "turns"
+
 class MongoDBManager:
     def __init__(self):
         # Load environment variables
         load_environment()
+
+        # RLock: a failed MongoDB write falls back to the local file under the same lock
+        self._session_locks = [threading.RLock() for _ in range(SESSION_LOCK_STRIPES)]
         
         # Get MongoDB connection string from environment or use default
         from environment import get_mongodb_uri
@@ -20,6 +40,7 @@ class MongoDBManager:
         print(f"📍 Connection type: {'MongoDB Atlas' if is_atlas else 'Local MongoDB'}")
         
         try:
+            from pymongo import MongoClient
             self.client = MongoClient(mongodb_uri, serverSelectionTimeoutMS=10000)
             # Test the connection
             self.client.admin.command('ping')
@@ -47,6 +68,24 @@ class MongoDBManager:
             self.db = None
             self.quotes_collection = None
 
+    def session_lock(self, session_id):
+        """Lock serializing this process's writes to one session document"""
+        return self._session_locks[hash(session_id) % SESSION_LOCK_STRIPES]
+
+    @contextmanager
+    def _locked_session_file(self, session_id):
+        """Hold the session lock and an exclusive lock on chat_sessions/ shared with other processes"""
+        with self.session_lock(session_id):
+            os.makedirs("chat_sessions", exist_ok=True)
+            with open(CHAT_SESSIONS_LOCK_FILE, 'a') as lock_file:
+                if fcntl:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    if fcntl:
+                        fcntl.flock(lock_file, fcntl.LOCK_UN)
+
     def save_quote_data(self, session_id, email, form_data):
         """Save quote data to MongoDB or local file as fallback"""
         if not self.connected:
@@ -329,62 +368,157 @@ class MongoDBManager:
             print(f"❌ Error saving HubSpot last sync time locally: {e}")
             return {"success": False, "error": str(e)}
 
+    def update_conversation_summary(self, session_id, summary, summarized_message_count):
+        """Persist the rolling conversation summary on an existing session document (Atlas or local fallback)"""
+        if not self.connected:
+            return self._update_conversation_summary_locally(session_id, summary, summarized_message_count)
+        try:
+            # No upsert: a document created here could race save_chat_session into a duplicate
+            with self.session_lock(session_id):
+                result = self.quotes_collection.update_one(
+                    {"session_id": session_id},
+                    {"$set": {
+                        "conversation_summary": summary,
+                        "summarized_message_count": summarized_message_count,
+                        "summary_updated_at": datetime.now()
+                    }}
+                )
+            if result.matched_count > 0:
+                print(f"✅ Conversation summary saved for session {session_id}")
+                return {"success": True}
+            return {"success": False, "error": "Session not found"}
+        except Exception as e:
+            print(f"❌ Error saving conversation summary to MongoDB: {e}")
+            return {"success": False, "error": str(e)}
+
+    def _update_conversation_summary_locally(self, session_id, summary, summarized_message_count):
+        try:
+            filename = f"chat_sessions/session_{session_id}.json"
+            with self._locked_session_file(session_id):
+                if not os.path.exists(filename):
+                    return {"success": False, "error": "Session not found"}
+                with open(filename, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                data["conversation_summary"] = summary
+                data["summarized_message_count"] = summarized_message_count
+                data["summary_updated_at"] = datetime.now().isoformat()
+                with open(filename, 'w', encoding='utf-8') as f:
+                    json.dump(data, f, indent=2, ensure_ascii=False, default=str)
+            print(f"✅ Conversation summary saved locally for session {session_id}")
+            return {"success": True}
+        except Exception as e:
+            print(f"❌ Error saving conversation summary locally: {e}")
+            return {"success": False, "error": str(e)}
+
+    def add_turn_usage(self, session_id, record, max_records=200):
+        """
+        Append one turn's token/cost/latency record and add it to the session totals (Atlas or local fallback).
+
+        Only an existing session document is updated: creating one here could
+        race save_chat_session into a second document for the same session.
+        """
+        if not self.connected:
+            return self._add_turn_usage_locally(session_id, record, max_records)
+        count_field = _usage_count_field(record)
+        try:
+            with self.session_lock(session_id):
+                result = self.quotes_collection.update_one(
+                    {"session_id": session_id},
+                    {
+                        "$push": {"usage": {"$each": [record], "$slice": -max_records}},
+                        "$inc": dict(
+                            {f"usage_totals.{key}": record.get(key) or 0 for key in USAGE_TOTAL_FIELDS},
+                            **{f"usage_totals.{count_field}": 1}
+                        )
+                    }
+                )
+            if result.matched_count > 0:
+                return {"success": True}
+            return {"success": False, "error": "Session not found"}
+        except Exception as e:
+            print(f"❌ Error saving turn usage to MongoDB: {e}")
+            return {"success": False, "error": str(e)}
+
+    def _add_turn_usage_locally(self, session_id, record, max_records=200):
+        try:
+            filename = f"chat_sessions/session_{session_id}.json"
+            with self._locked_session_file(session_id):
+                if not os.path.exists(filename):
+                    return {"success": False, "error": "Session not found"}
+                with open(filename, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                data["usage"] = (data.get("usage", []) + [record])[-max_records:]
+                totals = data.setdefault("usage_totals", {})
+                for key in USAGE_TOTAL_FIELDS:
+                    totals[key] = totals.get(key, 0) + (record.get(key) or 0)
+                count_field = _usage_count_field(record)
+                totals[count_field] = totals.get(count_field, 0) + 1
+                with open(filename, 'w', encoding='utf-8') as f:
+                    json.dump(data, f, indent=2, ensure_ascii=False, default=str)
+            return {"success": True}
+        except Exception as e:
+            print(f"❌ Error saving turn usage locally: {e}")
+            return {"success": False, "error": str(e)}
+
     def save_chat_session(self, session_id, email, messages, phone_number=None):
         """Save chat session to MongoDB quotes collection or local file as fallback"""
         if not self.connected:
             return self._save_chat_session_locally(session_id, email, messages, phone_number)
         
         try:
-            # Check if session already exists in quotes collection
-            existing_session = self.quotes_collection.find_one({"session_id": session_id})
+            # Serialized with usage and summary updates, so none of them can slip
+            # in between the lookup and the insert below
+            with self.session_lock(session_id):
+                # Check if session already exists in quotes collection
+                existing_session = self.quotes_collection.find_one({"session_id": session_id})
             
-            if existing_session:
-                # Update existing session with messages and phone number
-                update_data = {
-                    "email": email,
-                    "messages": messages,
-                    "updated_at": datetime.now(),
-                    "message_count": len(messages),
-                    "type": "chat_session"
-                }
+                if existing_session:
+                    # Update existing session with messages and phone number
+                    update_data = {
+                        "email": email,
+                        "messages": messages,
+                        "updated_at": datetime.now(),
+                        "message_count": len(messages),
+                        "type": "chat_session"
+                    }
                 
-                # Only update phone number if provided
-                if phone_number:
-                    update_data["phone_number"] = phone_number
+                    # Only update phone number if provided
+                    if phone_number:
+                        update_data["phone_number"] = phone_number
                 
-                result = self.quotes_collection.update_one(
-                    {"session_id": session_id},
-                    {"$set": update_data}
-                )
-                if result.modified_count > 0:
-                    print(f"✅ Chat session updated in quotes collection for session {session_id}")
-                    return {"success": True, "action": "updated", "session_id": session_id}
+                    result = self.quotes_collection.update_one(
+                        {"session_id": session_id},
+                        {"$set": update_data}
+                    )
+                    if result.modified_count > 0:
+                        print(f"✅ Chat session updated in quotes collection for session {session_id}")
+                        return {"success": True, "action": "updated", "session_id": session_id}
+                    else:
+                        print(f"⚠️  No changes made to chat session for session {session_id}")
+                        return {"success": False, "error": "No changes made"}
                 else:
-                    print(f"⚠️  No changes made to chat session for session {session_id}")
-                    return {"success": False, "error": "No changes made"}
-            else:
-                # Create new session in quotes collection
-                session_doc = {
-                    "session_id": session_id,
-                    "email": email,
-                    "messages": messages,
-                    "created_at": datetime.now(),
-                    "updated_at": datetime.now(),
-                    "message_count": len(messages),
-                    "type": "chat_session"
-                }
+                    # Create new session in quotes collection
+                    session_doc = {
+                        "session_id": session_id,
+                        "email": email,
+                        "messages": messages,
+                        "created_at": datetime.now(),
+                        "updated_at": datetime.now(),
+                        "message_count": len(messages),
+                        "type": "chat_session"
+                    }
                 
-                # Add phone number if provided
-                if phone_number:
-                    session_doc["phone_number"] = phone_number
+                    # Add phone number if provided
+                    if phone_number:
+                        session_doc["phone_number"] = phone_number
                 
-                result = self.quotes_collection.insert_one(session_doc)
-                if result.inserted_id:
-                    print(f"✅ Chat session saved in quotes collection for session {session_id}")
-                    return {"success": True, "action": "created", "session_id": session_id}
-                else:
-                    print(f"❌ Failed to save chat session for session {session_id}")
-                    return {"success": False, "error": "Failed to insert session"}
+                    result = self.quotes_collection.insert_one(session_doc)
+                    if result.inserted_id:
+                        print(f"✅ Chat session saved in quotes collection for session {session_id}")
+                        return {"success": True, "action": "created", "session_id": session_id}
+                    else:
+                        print(f"❌ Failed to save chat session for session {session_id}")
+                        return {"success": False, "error": "Failed to insert session"}
                     
         except Exception as e:
             print(f"❌ Error saving chat session to MongoDB: {e}")
@@ -457,24 +591,33 @@ class MongoDBManager:
     def _save_chat_session_locally(self, session_id, email, messages, phone_number=None):
         """Save chat session to local JSON file"""
         try:
-            os.makedirs("chat_sessions", exist_ok=True)
-            
-            session_data = {
-                "session_id": session_id,
-                "email": email,
-                "messages": messages,
-                "created_at": datetime.now().isoformat(),
-                "updated_at": datetime.now().isoformat(),
-                "message_count": len(messages)
-            }
-            
-            # Add phone number if provided
-            if phone_number:
-                session_data["phone_number"] = phone_number
-            
             filename = f"chat_sessions/session_{session_id}.json"
-            with open(filename, 'w', encoding='utf-8') as f:
-                json.dump(session_data, f, indent=2, ensure_ascii=False, default=str)
+
+            with self._locked_session_file(session_id):
+                # Keep fields stored by other updates (HubSpot ids, conversation summary, usage)
+                session_data = {}
+                if os.path.exists(filename):
+                    try:
+                        with open(filename, 'r', encoding='utf-8') as f:
+                            session_data = json.load(f)
+                    except Exception:
+                        session_data = {}
+
+                session_data.update({
+                    "session_id": session_id,
+                    "email": email,
+                    "messages": messages,
+                    "updated_at": datetime.now().isoformat(),
+                    "message_count": len(messages)
+                })
+                session_data.setdefault("created_at", session_data["updated_at"])
+
+                # Add phone number if provided
+                if phone_number:
+                    session_data["phone_number"] = phone_number
+
+                with open(filename, 'w', encoding='utf-8') as f:
+                    json.dump(session_data, f, indent=2, ensure_ascii=False, default=str)
             
             print(f"✅ Chat session saved locally to {filename}")
             return {"success": True, "action": "created", "filename": filename}
@@ -541,6 +684,7 @@ def test_mongodb_connection():
     """Test MongoDB connection for debugging"""
     try:
         from environment import get_mongodb_uri
+        from pymongo import MongoClient
         mongodb_uri = get_mongodb_uri()
         client = MongoClient(mongodb_uri, serverSelectionTimeoutMS=5000)
         client.admin.command('ping')
@@ -551,5 +695,23 @@ def test_mongodb_connection():
         return False
 
 
-# Create global instance
-mongodb_manager = MongoDBManager()
+class LazyMongoDBManager:
+    """Stands in for MongoDBManager and connects on first use instead of at import time"""
+
+    def __init__(self):
+        self._manager = None
+        self._lock = threading.Lock()
+
+    def get_manager(self):
+        if self._manager is None:
+            with self._lock:
+                if self._manager is None:
+                    self._manager = MongoDBManager()
+        return self._manager
+
+    def __getattr__(self, name):
+        return getattr(self.get_manager(), name)
+
+
+# Create global instance (connects on first use)
+mongodb_manager = LazyMongoDBManager()
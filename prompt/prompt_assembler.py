@@ -0,0 +1,209 @@
+import re
+from string import Template
+
+from environment import get_prompt_config
+from documents_processing_responses.text_chunker import get_token_counter
+from prompt.prompt import (
+    SIGN_NIZE_SYSTEM_PROMPT, CONTEXT_INSTRUCTIONS, EMAIL_COLLECTED_CONTEXT, EMAIL_NOT_COLLECTED_CONTEXT, SESSION_CONTEXT
+)
+
+EMAIL_PATTERN = re.compile(r'[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}')
+# An explicit marker is required, so "order 1200mm letters" is not read as an ID
+ORDER_ID_PATTERN = re.compile(r'\border\s*(?:id\b|number\b|no\b\.?|#)\s*(?:is\b|:)?\s*#?([A-Za-z0-9-]*\d[A-Za-z0-9-]{3,})', re.IGNORECASE)
+HASH_ID_PATTERN = re.compile(r'(?<![\w&])#(\d{4,})\b')
+PHONE_PATTERN = re.compile(r'(?<!\w)\+?\d[\d\s().-]{7,}\d(?!\w)')
+
+# Fixed per-message overhead of the chat format ("role: ", separators)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+QUOTE_STATE_DESCRIPTIONS = {
+    "form_shown": "quote form has been shown to the customer",
+    "submitted": "quote form has been submitted"
+}
+
+_config = get_prompt_config()
+_count_tokens = get_token_counter(_config['token_encoding'])
+
+# Compiled once at import. The static prefix is byte-identical on every
+# request so the provider's prompt-prefix cache can reuse it; everything
+# that varies comes after it, least volatile first.
+STATIC_SYSTEM_PROMPT = SIGN_NIZE_SYSTEM_PROMPT + CONTEXT_INSTRUCTIONS
+_EMAIL_COLLECTED_TEMPLATE = Template(EMAIL_COLLECTED_CONTEXT)
+_SESSION_CONTEXT_TEMPLATE = Template(SESSION_CONTEXT)
+
+
+def count_message_tokens(message, count_tokens=None):
+    return (count_tokens or _count_tokens)(message.get("content") or "") + MESSAGE_OVERHEAD_TOKENS
+
+
+def _looks_like_phone(text):
+    """Ten or more digits (or an international prefix) so sizes and budget ranges don't count"""
+    digits = sum(character.isdigit() for character in text)
+    return digits >= 10 or (text.strip().startswith("+") and digits >= 8)
+
+
+def _unique(values):
+    return list(dict.fromkeys(values))
+
+
+def extract_session_facts(session_data, messages=None):
+    """
+    Collect the facts the model must never lose, however much history is trimmed.
+
+    Order IDs and phone numbers are read from every user message so they
+    survive after the turns that mentioned them fall out of the window.
+    """
+    messages = session_data.get("messages", []) if messages is None else messages
+    user_texts = [m.get("content") or "" for m in messages if m.get("role") == "user"]
+
+    order_ids, phones = [], []
+    for text in user_texts:
+        order_ids.extend(ORDER_ID_PATTERN.findall(text))
+        order_ids.extend(HASH_ID_PATTERN.findall(text))
+        phones.extend(match.strip() for match in PHONE_PATTERN.findall(text) if _looks_like_phone(match))
+    phones = [phone for phone in phones if phone.lstrip("#") not in order_ids]
+
+    email = session_data.get("email") or session_data.get("customer_info", {}).get("email")
+    if not email:
+        for text in user_texts:
+            match = EMAIL_PATTERN.search(text)
+            if match:
+                email = match.group(0)
+                break
+
+    return {
+        "email": email,
+        "order_ids": _unique(order_ids),
+        "phone_numbers": _unique(phones),
+        "quote_state": session_data.get("quote_state"),
+        "message_count": len(messages)
+    }
+
+
+def select_history_window(messages, token_budget, min_recent_messages=4, count_tokens=None):
+    """
+    Pick the most recent messages that fit token_budget.
+
+    Walks back from the newest message; the last min_recent_messages are always
+    kept verbatim and older ones are added until the next would overflow the
+    budget. Returns (window, omitted_count, window_tokens); the same history
+    and budget always give the same window.
+    """
+    window = []
+    used_tokens = 0
+    for position in range(len(messages) - 1, -1, -1):
+        tokens = count_message_tokens(messages[position], count_tokens)
+        if len(window) >= min_recent_messages and used_tokens + tokens > token_budget:
+            break
+        window.append(messages[position])
+        used_tokens += tokens
+    window.reverse()
+    return window, len(messages) - len(window), used_tokens
+
+
+def assemble_conversation(session_data, user_message, token_budget=None, min_recent_messages=None):
+    """
+    Build the bounded conversation context for one turn.
+
+    Messages already folded into the session's rolling summary are replaced
+    by that summary. The current user message is removed from the history
+    (it is sent once, as the user message) and the rest is cut to the token
+    budget.
+    """
+    token_budget = _config['history_token_budget'] if token_budget is None else token_budget
+    min_recent_messages = _config['min_recent_messages'] if min_recent_messages is None else min_recent_messages
+
+    messages = list(session_data.get("messages", []))
+    facts = extract_session_facts(session_data, messages)
+    if messages and messages[-1].get("role") == "user" and messages[-1].get("content") == user_message:
+        messages = messages[:-1]
+
+    summary = session_data.get("conversation_summary")
+    if summary:
+        messages = messages[min(session_data.get("summarized_message_count", 0), len(messages)):]
+
+    window, omitted, history_tokens = select_history_window(messages, token_budget, min_recent_messages)
+    if omitted:
+        print(f"✂️  Prompt history trimmed: {omitted} older message(s) omitted, {len(window)} kept ({history_tokens} tokens)")
+    return {"facts": facts, "summary": summary, "history": window, "omitted": omitted, "history_tokens": history_tokens}
+
+
+def render_session_facts(facts):
+    lines = ["\nSESSION FACTS (always current, even if earlier messages are not shown):"]
+    lines.append(f"- Customer email: {facts['email'] or 'not collected'}")
+    if facts["order_ids"]:
+        lines.append(f"- Order ID(s) provided: {', '.join(facts['order_ids'])}")
+    if facts["phone_numbers"]:
+        lines.append(f"- Phone number(s) provided: {', '.join(facts['phone_numbers'])}")
+    lines.append(f"- Quote: {QUOTE_STATE_DESCRIPTIONS.get(facts['quote_state'], 'not requested yet')}")
+    return "\n".join(lines) + "\n"
+
+
+def render_summary(summary):
+    if not summary:
+        return ""
+    return f"\nSUMMARY OF EARLIER CONVERSATION:\n{summary}\n"
+
+
+def render_session_context(facts, summary, current_date):
+    """Per-session block: changes only when the email, facts or summary change (or the date)"""
+    if facts["email"]:
+        email_context = _EMAIL_COLLECTED_TEMPLATE.substitute(email=facts["email"])
+    else:
+        email_context = EMAIL_NOT_COLLECTED_CONTEXT
+    return _SESSION_CONTEXT_TEMPLATE.substitute(
+        date=current_date,
+        email_context=email_context,
+        session_facts=render_session_facts(facts),
+        summary=render_summary(summary)
+    )
+
+
+def render_turn_context(facts, omitted, knowledge_chunks):
+    """Per-turn block sent right before the user message"""
+    lines = [f"TURN CONTEXT\nMessages so far in this session: {facts['message_count']}"]
+    if omitted:
+        lines.append(f"{omitted} earlier message(s) are not shown (see the summary and session facts).")
+    if knowledge_chunks:
+        lines.append("\nKNOWLEDGE BASE CONTEXT:\n" + "\n\n".join(knowledge_chunks))
+    return "\n".join(lines)
+
+
+def build_prompt_messages(conversation, user_message, knowledge_chunks, current_date):
+    """
+    Lay out the chat messages from most to least stable.
+
+    1. static system prompt (identical for every request)
+    2. session context: date, email, session facts, rolling summary
+    3. conversation history as real user/assistant messages
+    4. turn context: message count and knowledge base chunks
+    5. the current user message, sent once
+    """
+    history = [
+        {"role": message["role"], "content": message["content"]}
+        for message in conversation["history"]
+        if message.get("role") in ("user", "assistant")
+    ]
+    return (
+        [
+            {"role": "system", "content": STATIC_SYSTEM_PROMPT},
+            {"role": "system", "content": render_session_context(conversation["facts"], conversation["summary"], current_date)}
+        ]
+        + history
+        + [
+            {"role": "system", "content": render_turn_context(conversation["facts"], conversation["omitted"], knowledge_chunks)},
+            {"role": "user", "content": user_message}
+        ]
+    )
+
+
+def prompt_section_tokens(messages):
+    """Estimated tokens per section of a prompt laid out by build_prompt_messages"""
+    counts = [count_message_tokens(message) for message in messages]
+    return {
+        "system": counts[0],
+        "session_context": counts[1],
+        "history": sum(counts[2:-2]),
+        "turn_context": counts[-2],
+        "user_message": counts[-1]
+    }
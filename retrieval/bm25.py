@@ -0,0 +1,149 @@
+import os
+import re
+import json
+import math
+
+BM25_FILENAME = "bm25_index.json"
+
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:-[a-z0-9]+)*")
+
+STOPWORDS = frozenset("""
+a an and are as at be but by can could do does for from had has have how i if in is it its me my of on or our
+so than that the their them then there these they this to us was we what when where which who why will with
+would you your yours about any some much many want need get like please tell know
+""".split())
+
+
+def tokenize(text):
+    """Lowercase word tokens; hyphenated terms ("halo-lit") also index their parts"""
+    tokens = []
+    for token in _TOKEN_PATTERN.findall(text.lower()):
+        tokens.append(token)
+        if "-" in token:
+            tokens.extend(token.split("-"))
+    return tokens
+
+
+def content_terms(text):
+    return [token for token in tokenize(text) if token not in STOPWORDS]
+
+
+class BM25Index:
+    """Okapi BM25 over knowledge base chunks backed by an inverted index.
+
+    Only the postings of the query's terms are visited, so a lookup costs
+    proportional to how many chunks contain those terms.
+    """
+
+    def __init__(self, ids, postings, doc_lengths, k1=1.5, b=0.75):
+        self.ids = ids
+        self.postings = postings  # term -> [[doc position, term frequency], ...]
+        self.doc_lengths = doc_lengths
+        self.k1 = k1
+        self.b = b
+        self.avg_doc_length = (sum(doc_lengths) / len(doc_lengths)) if doc_lengths else 0.0
+
+    @classmethod
+    def build(cls, ids, documents, k1=1.5, b=0.75):
+        postings = {}
+        doc_lengths = []
+        for position, document in enumerate(documents):
+            frequencies = {}
+            tokens = tokenize(document or "")
+            for token in tokens:
+                frequencies[token] = frequencies.get(token, 0) + 1
+            for token, frequency in frequencies.items():
+                postings.setdefault(token, []).append([position, frequency])
+            doc_lengths.append(len(tokens))
+        return cls(list(ids), postings, doc_lengths, k1, b)
+
+    @classmethod
+    def build_from_collection(cls, collection):
+        results = collection.get(include=["documents"])
+        return cls.build(results["ids"], results["documents"])
+
+    def save(self, path):
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                "ids": self.ids,
+                "postings": self.postings,
+                "doc_lengths": self.doc_lengths,
+                "k1": self.k1,
+                "b": self.b
+            }, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        return cls(data["ids"], data["postings"], data["doc_lengths"], data.get("k1", 1.5), data.get("b", 0.75))
+
+    def idf(self, term):
+        document_frequency = len(self.postings.get(term, ()))
+        total = len(self.ids)
+        return math.log(1 + (total - document_frequency + 0.5) / (document_frequency + 0.5))
+
+    def search(self, query, n_results=5):
+        """Return [(chunk id, score, matched term count)] best first"""
+        terms = set(content_terms(query))
+        scores = {}
+        matched = {}
+        for term in terms:
+            term_postings = self.postings.get(term)
+            if not term_postings:
+                continue
+            idf = self.idf(term)
+            for position, frequency in term_postings:
+                length_norm = 1 - self.b + self.b * self.doc_lengths[position] / (self.avg_doc_length or 1)
+                scores[position] = scores.get(position, 0.0) + idf * frequency * (self.k1 + 1) / (frequency + self.k1 * length_norm)
+                matched[position] = matched.get(position, 0) + 1
+
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:n_results]
+        return [(self.ids[position], score, matched[position]) for position, score in ranked]
+
+    def is_exact_term_hit(self, query, results, max_terms=4, max_document_ratio=0.1):
+        """
+        True when a short query's terms all appear in the top chunk and at least
+        one of them is rare, e.g. "channel letters" or "what is ACM". Such
+        queries can be answered lexically without an embedding call.
+        """
+        terms = set(content_terms(query))
+        if not results or not terms or len(terms) > max_terms:
+            return False
+        if results[0][2] < len(terms):
+            return False
+        rare_limit = max(1, int(len(self.ids) * max_document_ratio))
+        return any(0 < len(self.postings.get(term, ())) <= rare_limit for term in terms)
+
+
+def build_bm25_index(collection, storage_path):
+    """Build the lexical index over a collection's chunks and save it next to it"""
+    index = BM25Index.build_from_collection(collection)
+    index.save(os.path.join(storage_path, BM25_FILENAME))
+    print(f"✅ BM25 index built over {len(index.ids)} chunks ({len(index.postings)} terms)")
+    return index
+
+
+def load_bm25_index(storage_path, collection=None):
+    """Load the saved lexical index, rebuilding it in memory from the collection if missing"""
+    path = os.path.join(storage_path, BM25_FILENAME)
+    if os.path.exists(path):
+        try:
+            return BM25Index.load(path)
+        except Exception as e:
+            print(f"⚠️  Failed to load BM25 index {path}: {e}")
+    if collection is not None:
+        print("ℹ️  No saved BM25 index - building one in memory")
+        return BM25Index.build_from_collection(collection)
+    return None
+
+
+def reciprocal_rank_fusion(rankings, k=60):
+    """Fuse ranked id lists; returns [(id, fused score)] best first"""
+    scores = {}
+    for ranking in rankings:
+        for rank, chunk_id in enumerate(ranking):
+            scores[chunk_id] = scores.get(chunk_id, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
@@ -0,0 +1,84 @@
+from documents_processing_responses.text_chunker import approximate_token_count
+from retrieval.bm25 import tokenize
+
+
+def distance_to_similarity(distance):
+    """Squared L2 between unit vectors is 2 - 2 * cosine"""
+    return 1.0 - distance / 2.0
+
+
+def _cosine(a, b):
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = (sum(x * x for x in a) ** 0.5) * (sum(y * y for y in b) ** 0.5)
+    return dot / norm if norm else 0.0
+
+
+def _token_overlap(a, b):
+    """Jaccard overlap of word sets; stands in for cosine when embeddings are missing"""
+    a, b = set(tokenize(a)), set(tokenize(b))
+    return len(a & b) / len(a | b) if a and b else 0.0
+
+
+def chunk_token_count(candidate):
+    metadata = candidate.get("metadata") or {}
+    return metadata.get("token_count") or approximate_token_count(candidate["document"] or "")
+
+
+def select_context_chunks(candidates, query_embedding=None, max_distance=None, token_budget=None,
+                          max_chunks=None, mmr_lambda=0.7, duplicate_similarity=0.95):
+    """
+    Pick the chunks to paste into the prompt from ranked retrieval candidates.
+
+    Candidates are dicts with "id", "document", "distance" and optionally
+    "embedding" and "metadata". Chunks farther than max_distance are dropped
+    (candidates without a distance, found only by BM25, get one from their
+    embedding when possible). The rest are chosen greedily by maximal marginal
+    relevance, skipping near-duplicates (overlapping chunks) and anything that
+    would exceed token_budget (the most relevant chunk is always kept).
+    Returns the selected candidates, each with a "score" (relevance) and
+    "token_count".
+    """
+    pool = []
+    dropped = 0
+    for rank, candidate in enumerate(candidates):
+        candidate = dict(candidate)
+        if candidate.get("distance") is None and query_embedding is not None and candidate.get("embedding") is not None:
+            candidate["distance"] = max(0.0, 2.0 - 2.0 * _cosine(query_embedding, candidate["embedding"]))
+        if max_distance is not None and candidate.get("distance") is not None and candidate["distance"] > max_distance:
+            dropped += 1
+            continue
+        if candidate.get("distance") is not None:
+            candidate["score"] = distance_to_similarity(candidate["distance"])
+        else:
+            # Lexical-only results keep their fused rank order
+            candidate["score"] = 1.0 / (rank + 2)
+        candidate["token_count"] = chunk_token_count(candidate)
+        pool.append(candidate)
+    if dropped:
+        print(f"🚫 Dropped {dropped} chunk(s) beyond distance {max_distance}")
+
+    def similarity(a, b):
+        if a.get("embedding") is not None and b.get("embedding") is not None:
+            return _cosine(a["embedding"], b["embedding"])
+        return _token_overlap(a["document"] or "", b["document"] or "")
+
+    selected = []
+    used_tokens = 0
+    while pool and (max_chunks is None or len(selected) < max_chunks):
+        best, best_value, best_redundancy = None, None, 0.0
+        for candidate in pool:
+            redundancy = max((similarity(candidate, chosen) for chosen in selected), default=0.0)
+            value = mmr_lambda * candidate["score"] - (1 - mmr_lambda) * redundancy
+            if best_value is None or value > best_value:
+                best, best_value, best_redundancy = candidate, value, redundancy
+        pool.remove(best)
+
+        if best_redundancy >= duplicate_similarity:
+            print(f"🚫 Dropped near-duplicate chunk {best['id']} (similarity {best_redundancy:.3f})")
+            continue
+        if token_budget is not None and selected and used_tokens + best["token_count"] > token_budget:
+            continue
+        selected.append(best)
+        used_tokens += best["token_count"]
+
+    return selected
@@ -0,0 +1,216 @@
+import os
+import json
+
+VECTORS_FILENAME = "vectors.npy"
+CHUNKS_FILENAME = "chunks.json"
+SCALES_FILENAME = "scales.npy"
+QUANTIZATIONS = ("float16", "int8")
+
+# Rows converted to float32 at a time when scanning a quantized matrix
+SCAN_BLOCK_ROWS = 8192
+
+
+def get_quantized_filename(quantization):
+    return f"vectors.{quantization}.npy"
+
+
+def quantize_vectors(vectors, quantization):
+    """
+    Quantize row-normalised float32 vectors.
+
+    float16 halves the size; int8 quarters it, storing each row as
+    round(v / scale) with a per-row scale of max(|v|) / 127. Returns
+    (matrix, scales), scales being None for float16.
+    """
+    import numpy as np
+
+    if quantization == "float16":
+        return vectors.astype(np.float16), None
+    if quantization == "int8":
+        scales = np.abs(vectors).max(axis=1) / 127.0 if len(vectors) else np.zeros(0, dtype=np.float32)
+        scales[scales == 0] = 1.0
+        quantized = np.clip(np.rint(vectors / scales[:, np.newaxis]), -127, 127).astype(np.int8)
+        return quantized, scales.astype(np.float32)
+    raise ValueError(f"Unknown quantization '{quantization}' (expected one of {', '.join(QUANTIZATIONS)})")
+
+
+def export_numpy_index(collection, output_dir, quantization=None):
+    """
+    Write a collection's vectors and chunks in the NumpyVectorIndex layout.
+
+    vectors.npy holds a contiguous row-normalised float32 matrix (one row per
+    chunk) and chunks.json the matching ids, documents and metadata. With
+    quantization ("float16" or "int8") a compact copy of the matrix is written
+    too (vectors.int8.npy plus scales.npy for int8).
+    """
+    import numpy as np
+
+    results = collection.get(include=["embeddings", "documents", "metadatas"])
+    ids = list(results["ids"])
+    os.makedirs(output_dir, exist_ok=True)
+
+    if ids:
+        vectors = np.asarray(results["embeddings"], dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        vectors = np.ascontiguousarray(vectors / norms)
+    else:
+        vectors = np.zeros((0, 0), dtype=np.float32)
+    np.save(os.path.join(output_dir, VECTORS_FILENAME), vectors)
+
+    if quantization and quantization != "none":
+        quantized, scales = quantize_vectors(vectors, quantization)
+        np.save(os.path.join(output_dir, get_quantized_filename(quantization)), quantized)
+        if scales is not None:
+            np.save(os.path.join(output_dir, SCALES_FILENAME), scales)
+        print(f"✅ Wrote {quantization} vectors ({quantized.nbytes / 1e6:.1f} MB vs {vectors.nbytes / 1e6:.1f} MB float32)")
+
+    with open(os.path.join(output_dir, CHUNKS_FILENAME), 'w', encoding='utf-8') as f:
+        json.dump({
+            "ids": ids,
+            "documents": list(results["documents"] or []),
+            "metadatas": list(results["metadatas"] or [])
+        }, f, ensure_ascii=False)
+
+    print(f"✅ Exported {len(ids)} vectors to {output_dir}")
+    return len(ids)
+
+
+def has_numpy_index(index_dir):
+    return (
+        os.path.exists(os.path.join(index_dir, VECTORS_FILENAME))
+        and os.path.exists(os.path.join(index_dir, CHUNKS_FILENAME))
+    )
+
+
+class NumpyVectorIndex:
+    """In-memory retrieval backend over a memory-mapped float32 matrix.
+
+    Implements the subset of the Chroma collection API used for retrieval
+    (count, get, query) and returns results in the same shape, so it can be
+    used anywhere a collection is queried. Scores are one matrix product per
+    batch of queries with top-k selection via argpartition. Distances are
+    squared L2 between unit vectors (2 - 2 * cosine), matching Chroma's
+    default space for normalised OpenAI embeddings.
+
+    With a quantized matrix (float16 or int8) loaded in memory, the scan runs
+    over it instead and the top rerank_factor * n_results candidates are
+    re-scored against the float32 rows, which stay memory-mapped on disk so
+    only those rows are read.
+    """
+
+    def __init__(self, vectors, ids, documents, metadatas=None, embedding_function=None,
+                 quantized=None, scales=None, rerank_factor=4):
+        self.vectors = vectors
+        self.ids = ids
+        self.documents = documents
+        self.metadatas = metadatas or [None] * len(ids)
+        self.embedding_function = embedding_function
+        self.quantized = quantized
+        self.scales = scales
+        self.rerank_factor = rerank_factor
+        self._positions = {chunk_id: position for position, chunk_id in enumerate(ids)}
+
+    @classmethod
+    def load(cls, index_dir, embedding_function=None, quantization=None, rerank_factor=4):
+        import numpy as np
+
+        vectors = np.load(os.path.join(index_dir, VECTORS_FILENAME), mmap_mode='r')
+        with open(os.path.join(index_dir, CHUNKS_FILENAME), 'r', encoding='utf-8') as f:
+            chunks = json.load(f)
+
+        quantized, scales = None, None
+        if quantization and quantization != "none":
+            quantized_path = os.path.join(index_dir, get_quantized_filename(quantization))
+            if os.path.exists(quantized_path):
+                quantized = np.load(quantized_path)
+                if quantization == "int8":
+                    scales = np.load(os.path.join(index_dir, SCALES_FILENAME))
+            else:
+                print(f"⚠️  No {quantization} vectors in {index_dir} - scanning float32 vectors")
+
+        print(f"✅ Loaded NumPy vector index with {len(chunks['ids'])} chunks from {index_dir}"
+              + (f" ({quantization}, {quantized.nbytes / 1e6:.1f} MB in memory)" if quantized is not None else ""))
+        return cls(vectors, chunks["ids"], chunks["documents"], chunks.get("metadatas"), embedding_function,
+                   quantized, scales, rerank_factor)
+
+    def count(self):
+        return len(self.ids)
+
+    def get(self, ids=None, include=("documents", "metadatas")):
+        positions = range(len(self.ids)) if ids is None else [self._positions[i] for i in ids if i in self._positions]
+        return self._gather(list(positions), include)
+
+    def _gather(self, positions, include):
+        return {
+            "ids": [self.ids[p] for p in positions],
+            "documents": [self.documents[p] for p in positions] if "documents" in include else None,
+            "metadatas": [self.metadatas[p] for p in positions] if "metadatas" in include else None,
+            "embeddings": [self.vectors[p].tolist() for p in positions] if "embeddings" in include else None
+        }
+
+    def _approximate_similarities(self, queries):
+        """Similarities against the quantized matrix, converted to float32 one block at a time"""
+        import numpy as np
+
+        similarities = np.empty((len(queries), len(self.quantized)), dtype=np.float32)
+        for start in range(0, len(self.quantized), SCAN_BLOCK_ROWS):
+            block = self.quantized[start:start + SCAN_BLOCK_ROWS].astype(np.float32)
+            similarities[:, start:start + len(block)] = queries @ block.T
+        if self.scales is not None:
+            similarities *= self.scales
+        return similarities
+
+    def _top_k(self, similarities, k):
+        import numpy as np
+
+        if k < similarities.shape[1]:
+            return np.argpartition(-similarities, k - 1, axis=1)[:, :k]
+        return np.tile(np.arange(similarities.shape[1]), (len(similarities), 1))
+
+    def query(self, query_texts=None, query_embeddings=None, n_results=10,
+              include=("documents", "metadatas", "distances")):
+        import numpy as np
+
+        if query_embeddings is None:
+            if self.embedding_function is None:
+                raise ValueError("query_texts requires an embedding function")
+            query_embeddings = self.embedding_function(list(query_texts))
+
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        if queries.ndim == 1:
+            queries = queries[np.newaxis, :]
+        norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        queries = queries / norms
+
+        result = {key: [] for key in ("ids", "documents", "metadatas", "embeddings", "distances")}
+        k = min(n_results, len(self.ids))
+        if k == 0:
+            for key in result:
+                result[key] = [[] for _ in range(len(queries))]
+        else:
+            if self.quantized is not None:
+                shortlist = self._top_k(self._approximate_similarities(queries), min(k * self.rerank_factor, len(self.ids)))
+            else:
+                similarities = queries @ self.vectors.T  # (queries, chunks)
+                shortlist = self._top_k(similarities, k)
+
+            for row, row_candidates in enumerate(shortlist):
+                if self.quantized is not None:
+                    # Full precision re-rank over the shortlist only
+                    row_candidates = np.sort(row_candidates)
+                    row_similarities = np.asarray(self.vectors[row_candidates], dtype=np.float32) @ queries[row]
+                else:
+                    row_similarities = similarities[row, row_candidates]
+                order = np.argsort(-row_similarities)[:k]
+                positions = row_candidates[order]
+                gathered = self._gather(positions.tolist(), include)
+                for key in ("ids", "documents", "metadatas", "embeddings"):
+                    result[key].append(gathered[key])
+                result["distances"].append(np.maximum(0.0, 2.0 - 2.0 * row_similarities[order]).tolist())
+
+        for key in ("documents", "metadatas", "embeddings", "distances"):
+            if key not in include:
+                result[key] = None
+        return result
@@ -0,0 +1,360 @@
+import threading
+import time
+from datetime import datetime
+
+from environment import get_retrieval_config
+from documents_processing_responses.query_and_response import query_documents
+
+
+class RetrievalService:
+    """Process-wide owner of the knowledge base retrieval backend.
+
+    The collection is opened on first use (or via warm_up) and then shared by
+    ingestion in app.py and retrieval in chatbot.py, so the process holds a
+    single PersistentClient and embedding function.
+
+    When build_index.py has published an index artifact, that artifact is
+    opened read-only and `version` names it; otherwise the legacy storage at
+    chroma_path is used and ingested into at startup. With RETRIEVAL_BACKEND=numpy,
+    artifacts are served by the in-memory NumpyVectorIndex instead of Chroma;
+    both expose the same query() result shape. A BM25 index over the same
+    chunks is loaded alongside the vector backend for hybrid search.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._reindex_lock = threading.Lock()
+        self._collection = None
+        self._bm25 = None
+        self._embedding_function = None
+        self.config = get_retrieval_config()
+        self.version = None
+        self.read_only = False
+        self.reindex_status = {"state": "idle"}
+
+    def get_embedding_function(self):
+        """One query embedding function for the process, reused across index swaps"""
+        if self._embedding_function is None:
+            from environment import get_openai_key
+            from chromadb_setup import CachedOpenAIEmbeddingFunction
+            self._embedding_function = CachedOpenAIEmbeddingFunction(get_openai_key())
+        return self._embedding_function
+
+    def _open_collection(self, path):
+        from environment import get_openai_key
+        from chromadb_setup import initialize_chromadb
+
+        print(f"🚀 Opening knowledge base collection at {path}...")
+        return initialize_chromadb(
+            get_openai_key(),
+            path=path,
+            collection_name=self.config['collection_name'],
+            embedding_function=self.get_embedding_function()
+        )
+
+    def _open_artifact(self, version):
+        """Open a published artifact with the configured backend (chroma or numpy)"""
+        from ingestion.index_artifacts import get_artifact_chroma_path, get_artifact_numpy_path
+        from retrieval.numpy_backend import NumpyVectorIndex, has_numpy_index
+
+        if self.config['backend'] == "numpy":
+            numpy_path = get_artifact_numpy_path(self.config['index_dir'], version)
+            if has_numpy_index(numpy_path):
+                return NumpyVectorIndex.load(
+                    numpy_path,
+                    embedding_function=self.get_embedding_function(),
+                    quantization=self.config['quantization'],
+                    rerank_factor=self.config['rerank_factor']
+                )
+            print(f"⚠️  Artifact {version} has no NumPy export - falling back to ChromaDB")
+        return self._open_collection(get_artifact_chroma_path(self.config['index_dir'], version))
+
+    def _load_bm25(self, storage_path, collection):
+        if not self.config['hybrid']:
+            return None
+        from retrieval.bm25 import load_bm25_index
+        try:
+            return load_bm25_index(storage_path, collection)
+        except Exception as e:
+            print(f"⚠️  BM25 index unavailable - using vector search only: {e}")
+            return None
+
+    def _open(self):
+        from ingestion.index_artifacts import get_current_version, get_artifact_chroma_path
+
+        version = get_current_version(self.config['index_dir'])
+        if version:
+            self._collection = self._open_artifact(version)
+            self._bm25 = self._load_bm25(get_artifact_chroma_path(self.config['index_dir'], version), self._collection)
+        else:
+            # Startup ingestion writes into this collection, so it is always ChromaDB
+            self._collection = self._open_collection(self.config['chroma_path'])
+            # Loaded lazily in search(), after startup ingestion has built it
+            self._bm25 = None
+
+        self.version = version
+        self.read_only = version is not None
+        if version:
+            print(f"✅ Knowledge base initialized from index artifact {version} (read-only)")
+        else:
+            print("✅ ChromaDB collection initialized")
+
+    def has_published_artifact(self):
+        """True when build_index.py has published an artifact (checked without opening Chroma)"""
+        from ingestion.index_artifacts import get_current_version
+        return get_current_version(self.config['index_dir']) is not None
+
+    def get_collection(self):
+        """Return the shared collection, opening it on first call"""
+        if self._collection is None:
+            with self._lock:
+                if self._collection is None:
+                    self._open()
+        return self._collection
+
+    def warm_up(self):
+        """Open the collection ahead of the first request"""
+        try:
+            self.get_collection()
+            return True
+        except Exception as e:
+            print(f"⚠️  Failed to initialize ChromaDB: {e}")
+            return False
+
+    def query(self, questions, n_results=3, include_scores=False):
+        return query_documents(self.get_collection(), questions, n_results=n_results, include_scores=include_scores)
+
+    def embed_query(self, text):
+        return self.get_embedding_function()([text])[0]
+
+    def _snapshot(self):
+        """The live collection and its lexical index, read together so a swap can't split them"""
+        collection = self.get_collection()
+        with self._lock:
+            if self._bm25 is None and self.config['hybrid'] and not self.read_only:
+                self._bm25 = self._load_bm25(self.config['chroma_path'], self._collection)
+            return self._collection, self._bm25
+
+    @staticmethod
+    def _get_chunks(collection, ids):
+        if not ids:
+            return {}
+        results = collection.get(ids=list(ids), include=["documents", "metadatas", "embeddings"])
+        metadatas = results.get("metadatas") or [None] * len(results["ids"])
+        embeddings = results.get("embeddings")
+        if embeddings is None:
+            embeddings = [None] * len(results["ids"])
+        return {
+            chunk_id: {"id": chunk_id, "document": document, "metadata": metadata, "embedding": embedding}
+            for chunk_id, document, metadata, embedding in zip(results["ids"], results["documents"], metadatas, embeddings)
+        }
+
+    def search(self, question, n_results=3):
+        """
+        Return the chunks to use as context for a question, with ids and scores.
+
+        With hybrid retrieval, BM25 and vector candidates are fused by
+        reciprocal-rank fusion. A short query whose terms all appear in the
+        top BM25 chunk (e.g. "channel letters", "ACM") is answered lexically
+        and skips the embedding call. Candidates beyond the configured
+        distance threshold are dropped and the rest chosen by maximal marginal
+        relevance within the context token budget, up to n_results chunks.
+
+        Returns {"ids", "documents", "distances", "scores", "query_embedding",
+        "mode", "timings"}; distances are None for lexical-only chunks without
+        an embedding and query_embedding is None when no embedding was made.
+        timings holds the seconds spent in each retrieval stage.
+        """
+        from retrieval.bm25 import reciprocal_rank_fusion
+        from retrieval.context_selection import select_context_chunks
+
+        collection, bm25 = self._snapshot()
+        candidates = max(n_results, self.config['hybrid_candidates'])
+        timings = {}
+        started = time.perf_counter()
+        lexical_results = bm25.search(question, candidates) if bm25 else []
+        lexical_ids = [chunk_id for chunk_id, _, _ in lexical_results]
+        timings["lexical"] = time.perf_counter() - started
+
+        if lexical_results and bm25.is_exact_term_hit(question, lexical_results):
+            print("🔤 Exact term match - answered from BM25 index without embedding")
+            query_embedding = None
+            chunks = self._get_chunks(collection, lexical_ids)
+            ranked_ids = lexical_ids
+            mode = "lexical"
+        else:
+            started = time.perf_counter()
+            query_embedding = self.embed_query(question)
+            timings["embedding"] = time.perf_counter() - started
+            started = time.perf_counter()
+            results = collection.query(
+                query_embeddings=[query_embedding],
+                n_results=candidates,
+                include=["documents", "metadatas", "embeddings", "distances"]
+            )
+            vector_ids = results["ids"][0]
+            metadatas = (results.get("metadatas") or [None])[0] or [None] * len(vector_ids)
+            embeddings = (results.get("embeddings") or [None])[0]
+            if embeddings is None:
+                embeddings = [None] * len(vector_ids)
+            chunks = {
+                chunk_id: {"id": chunk_id, "document": document, "metadata": metadata,
+                           "embedding": embedding, "distance": distance}
+                for chunk_id, document, metadata, embedding, distance in zip(
+                    vector_ids, results["documents"][0], metadatas, embeddings, results["distances"][0]
+                )
+            }
+            if lexical_results:
+                ranked_ids = [chunk_id for chunk_id, _ in reciprocal_rank_fusion([vector_ids, lexical_ids])]
+                chunks.update(self._get_chunks(collection, [i for i in ranked_ids if i not in chunks]))
+                mode = "hybrid"
+            else:
+                ranked_ids = vector_ids
+                mode = "vector"
+            timings["vector_search"] = time.perf_counter() - started
+
+        started = time.perf_counter()
+        selected = select_context_chunks(
+            [chunks[chunk_id] for chunk_id in ranked_ids if chunk_id in chunks],
+            query_embedding=query_embedding,
+            max_distance=self.config['max_distance'],
+            token_budget=self.config['context_token_budget'],
+            max_chunks=n_results,
+            mmr_lambda=self.config['mmr_lambda']
+        )
+        timings["selection"] = time.perf_counter() - started
+        print(f"📚 Selected {len(selected)} of {len(chunks)} candidate chunks ({mode}, "
+              f"{sum(chunk['token_count'] for chunk in selected)} tokens)")
+        return {
+            "ids": [chunk["id"] for chunk in selected],
+            "documents": [chunk["document"] for chunk in selected],
+            "distances": [chunk.get("distance") for chunk in selected],
+            "scores": [round(chunk["score"], 4) for chunk in selected],
+            "query_embedding": query_embedding,
+            "mode": mode,
+            "timings": timings
+        }
+
+    def swap_to_version(self, version):
+        """
+        Open a published artifact and make it the live collection.
+
+        The new collection is fully opened before the reference is swapped, so
+        requests already holding the old collection finish against it and new
+        requests only ever see a complete index.
+        """
+        from ingestion.index_artifacts import get_artifact_chroma_path
+
+        new_collection = self._open_artifact(version)
+        new_bm25 = self._load_bm25(get_artifact_chroma_path(self.config['index_dir'], version), new_collection)
+        with self._lock:
+            previous_version = self.version
+            self._collection = new_collection
+            self._bm25 = new_bm25
+            self.version = version
+            self.read_only = True
+        print(f"🔄 Knowledge base swapped from {previous_version or 'startup index'} to {version}")
+
+    def refresh_if_stale(self):
+        """Pick up an artifact published by another process (e.g. build_index.py)"""
+        from ingestion.index_artifacts import get_current_version
+
+        if self._collection is None:
+            return False  # nothing open yet; the first query opens CURRENT
+        current_version = get_current_version(self.config['index_dir'])
+        if current_version and current_version != self.version:
+            self.swap_to_version(current_version)
+            return True
+        return False
+
+    def reindex(self, openai_client, from_scratch=False, refuse_shrink=False, only_if_stale=False):
+        """
+        Rebuild the index from the data directory and swap it in atomically.
+
+        Only changed files are re-chunked and re-embedded (the build starts
+        from a copy of the live index). Returns the new version, or None if a
+        reindex is already running here or in another process, or (with
+        only_if_stale) if the active artifact already matches the data directory.
+        refuse_shrink is passed to build_index_artifact for automatic rebuilds.
+        """
+        from ingestion.index_artifacts import artifact_build_lock, get_current_version, artifact_matches_data
+
+        if not self._reindex_lock.acquire(blocking=False):
+            print("ℹ️  Reindex already in progress - skipping")
+            return None
+
+        try:
+            with artifact_build_lock(self.config['index_dir'], blocking=False) as acquired:
+                if not acquired:
+                    print("ℹ️  Another process is building an index artifact - skipping")
+                    return None
+                if only_if_stale:
+                    # Checked under the lock: another process may have just published a fresh artifact
+                    current_version = get_current_version(self.config['index_dir'])
+                    if current_version is None or artifact_matches_data(
+                        self.config['index_dir'], current_version, self.config['data_dir']
+                    ):
+                        return None
+                    print(f"📝 Knowledge base files changed since index artifact {current_version} was built - reindexing")
+                return self._build_and_swap(openai_client, from_scratch, refuse_shrink)
+        finally:
+            self._reindex_lock.release()
+
+    def _build_and_swap(self, openai_client, from_scratch, refuse_shrink):
+        from environment import get_openai_key
+        from ingestion.index_artifacts import build_index_artifact, prune_index_artifacts
+
+        try:
+            self.reindex_status = {"state": "running", "started_at": datetime.now().isoformat()}
+            # Before the first artifact exists, seed the build from the startup index
+            # (build_index_artifact prefers the active artifact when there is one)
+            seed_chroma_path = None if self.version else self.config['chroma_path']
+            version = build_index_artifact(
+                openai_client,
+                get_openai_key(),
+                self.config['data_dir'],
+                self.config['index_dir'],
+                collection_name=self.config['collection_name'],
+                from_scratch=from_scratch,
+                seed_chroma_path=seed_chroma_path,
+                quantization=self.config['quantization'],
+                refuse_shrink=refuse_shrink
+            )
+            self.swap_to_version(version)
+            prune_index_artifacts(self.config['index_dir'])
+            self.reindex_status = {"state": "idle", "version": version, "finished_at": datetime.now().isoformat()}
+            return version
+        except Exception as e:
+            print(f"❌ Knowledge base reindex failed: {e}")
+            self.reindex_status = {"state": "failed", "error": str(e), "finished_at": datetime.now().isoformat()}
+            raise
+
+    def reindex_if_stale(self, openai_client):
+        """
+        Reindex when data/ no longer matches the files the CURRENT artifact was built from.
+
+        Files edited while no process was running are not seen by the watcher,
+        whose baseline is taken from data/ at startup, so app.py runs this once
+        at boot (KB_REINDEX_ON_STARTUP). Only one process builds; the build is
+        not published if it has no chunks or fewer files than the artifact.
+        Returns the new version, or None if nothing was built.
+        """
+        return self.reindex(openai_client, refuse_shrink=True, only_if_stale=True)
+
+    def reindex_in_background(self, openai_client, from_scratch=False):
+        """Start a reindex on a daemon thread; returns False if one is already running"""
+        if self._reindex_lock.locked():
+            return False
+
+        def run():
+            try:
+                self.reindex(openai_client, from_scratch)
+            except Exception:
+                pass  # already logged and recorded in reindex_status
+
+        threading.Thread(target=run, name="kb-reindex", daemon=True).start()
+        return True
+
+
+# Create global instance
+retrieval_service = RetrievalService()
@@ -1,41 +1,55 @@
 from datetime import datetime
+import threading
 from environment import get_google_credentials, get_hubspot_config, get_dropbox_config,get_flask_config, get_mongodb_uri
 from chatbot.chatbot import build_conversation_text
-import gspread
 
 
 # Google Sheets configuration
 SCOPES = ['https://www.googleapis.com/auth/spreadsheets']
+SPREADSHEET_ID = '1qKhBrL2SSuT4iYkH5DExBhSaXyi4l8U1uXAcnWJng7Q'
 
-# Initialize Google Sheets client
+# Google Sheets client is created on first save, not at import time
 sheets_client = None
 worksheet = None
 GOOGLE_SHEETS_ENABLED = False
-
-try:
-
-    creds = get_google_credentials()
-
-    if creds:
-        print("✅ Using Google credentials from environment or file")
-        creds = creds.with_scopes(SCOPES)
-    else:
-        print("⚠️  Google credentials not found. Google Sheets integration disabled.")
-        raise FileNotFoundError("Google credentials not found")
-
-    sheets_client = gspread.authorize(creds)
-    SPREADSHEET_ID = '1qKhBrL2SSuT4iYkH5DExBhSaXyi4l8U1uXAcnWJng7Q'
-    worksheet = sheets_client.open_by_key(SPREADSHEET_ID).sheet1
-    GOOGLE_SHEETS_ENABLED = True
-    print("✅ Google Sheets connected successfully")
-
-except Exception as e:
-    print(f"⚠️  Google Sheets connection failed: {e}")
-    worksheet = None
+_sheets_initialized = False
+_sheets_lock = threading.Lock()
+
+def init_google_sheets():
+    """Connect to Google Sheets once; later calls reuse the result"""
+    global sheets_client, worksheet, GOOGLE_SHEETS_ENABLED, _sheets_initialized
+    if _sheets_initialized:
+        return GOOGLE_SHEETS_ENABLED
+
+    with _sheets_lock:
+        if _sheets_initialized:
+            return GOOGLE_SHEETS_ENABLED
+        try:
+
+            creds = get_google_credentials()
+
+            if creds:
+                print("✅ Using Google credentials from environment or file")
+                creds = creds.with_scopes(SCOPES)
+            else:
+                print("⚠️  Google credentials not found. Google Sheets integration disabled.")
+                raise FileNotFoundError("Google credentials not found")
+
+            import gspread
+            sheets_client = gspread.authorize(creds)
+            worksheet = sheets_client.open_by_key(SPREADSHEET_ID).sheet1
+            GOOGLE_SHEETS_ENABLED = True
+            print("✅ Google Sheets connected successfully")
+
+        except Exception as e:
+            print(f"⚠️  Google Sheets connection failed: {e}")
+            worksheet = None
+        _sheets_initialized = True
+    return GOOGLE_SHEETS_ENABLED
 
 def save_session_to_sheets(session_id, email, chat_history, update_existing=False):
     """Save session data to Google Sheets - one row per session with full conversation"""
-    if not GOOGLE_SHEETS_ENABLED:
+    if not init_google_sheets():
         print("⚠️  Google Sheets integration disabled - skipping Google Sheets save")
         return False
 
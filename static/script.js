@@ -502,6 +502,60 @@ async function sendMessageToBot(message) {
     addTypingIndicator();
     isTyping = true;
     
+    try {
+        const response = await fetch('/chat/stream', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json'
+            },
+            body: JSON.stringify({ 
+                message: message,
+                session_id: sessionId,
+                email: userEmail
+            })
+        });
+
+        if (!response.ok || !response.body || typeof TextDecoder === 'undefined') {
+            // Streaming not available (older server or browser): use the buffered endpoint
+            await sendMessageToBotBuffered(message);
+            return;
+        }
+
+        let messageDiv = null;
+        let reply = '';
+        let doneData = null;
+
+        await readServerSentEvents(response, (event, data) => {
+            if (event === 'token') {
+                reply += data.text;
+                if (!messageDiv) {
+                    messageDiv = addMessage('ai', reply);
+                } else {
+                    messageDiv.querySelector('.message-bubble p').innerHTML = formatMessage(reply);
+                    scrollToBottom();
+                }
+            } else if (event === 'done') {
+                doneData = data;
+            } else if (event === 'error') {
+                throw new Error(data.message || 'Failed to send message');
+            }
+        });
+
+        if (!doneData) {
+            throw new Error('Stream ended before the reply was complete');
+        }
+        handleBotReply(reply, doneData);
+    } catch (error) {
+        console.error('Error:', error);
+        addMessage('ai', 'Sorry, I encountered an error. Please try again.');
+    } finally {
+        isTyping = false;
+        focusInput();
+    }
+}
+
+// Non-streaming fallback: waits for the full reply from /chat
+async function sendMessageToBotBuffered(message) {
     try {
         const response = await fetch('/chat', {
             method: 'POST',
@@ -520,30 +574,53 @@ async function sendMessageToBot(message) {
         if (response.ok) {
           
             addMessage('ai', data.message);
-            
-           
-            if (data.quote_form_triggered && emailCollected) {
-                setTimeout(() => {
-                    showQuoteForm();
-                }, 1000);
-            }
-           
-            if (data.message.toLowerCase().includes('email') && !emailCollected) {
-                showEmailField();
-            }
-            
-
-          
-          
+            handleBotReply(data.message, data);
         } else {
             throw new Error(data.message || 'Failed to send message');
         }
     } catch (error) {
         console.error('Error:', error);
         addMessage('ai', 'Sorry, I encountered an error. Please try again.');
-    } finally {
-        isTyping = false;
-        focusInput();
+    }
+}
+
+// Read a text/event-stream response body, calling onEvent(event, data) for each event
+async function readServerSentEvents(response, onEvent) {
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+
+        let boundary;
+        while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+            const rawEvent = buffer.slice(0, boundary);
+            buffer = buffer.slice(boundary + 2);
+
+            let event = 'message';
+            let data = '';
+            rawEvent.split('\n').forEach(line => {
+                if (line.startsWith('event:')) event = line.slice(6).trim();
+                else if (line.startsWith('data:')) data += line.slice(5).trim();
+            });
+            if (data) onEvent(event, JSON.parse(data));
+        }
+    }
+}
+
+// Quote form and email prompts once the full reply is known
+function handleBotReply(reply, data) {
+    if (data.quote_form_triggered && emailCollected) {
+        setTimeout(() => {
+            showQuoteForm();
+        }, 1000);
+    }
+   
+    if (reply.toLowerCase().includes('email') && !emailCollected) {
+        showEmailField();
     }
 }
 
@@ -1037,6 +1114,7 @@ function addMessage(sender, content) {
     
     chatMessages.appendChild(messageDiv);
     scrollToBottom();
+    return messageDiv;
 }
 
 // Format message content (handle links, code blocks, etc.)
@@ -0,0 +1,36 @@
+import pytest
+
+import import_report
+
+
+def test_find_heavy_imports_matches_packages_and_submodules():
+    entries = [
+        {"module": "json", "self_us": 100, "cumulative_us": 100, "depth": 0},
+        {"module": "pymongo.collection", "self_us": 300, "cumulative_us": 900, "depth": 1},
+        {"module": "pymongo", "self_us": 200, "cumulative_us": 4000, "depth": 0},
+        {"module": "dropboxer", "self_us": 10, "cumulative_us": 10, "depth": 0},
+    ]
+
+    assert import_report.find_heavy_imports(entries) == {"pymongo": 4000}
+
+
+def test_importing_app_loads_no_heavy_integration(tmp_path, monkeypatch):
+    for module in ("flask", "flask_cors", "openai"):
+        pytest.importorskip(module)
+
+    # A published artifact with warm-up off, so importing app runs no ingestion
+    index_dir = tmp_path / "index_artifacts"
+    (index_dir / "v1" / "chroma").mkdir(parents=True)
+    (index_dir / "CURRENT").write_text("v1\n", encoding="utf-8")
+    monkeypatch.setenv("KB_INDEX_DIR", str(index_dir))
+    monkeypatch.setenv("KB_WARM_UP", "false")
+    monkeypatch.setenv("KB_WATCH_INTERVAL", "0")
+    monkeypatch.setenv("KB_REINDEX_ON_STARTUP", "false")
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    monkeypatch.setenv("MONGODB_URI", "mongodb://localhost:27017")
+
+    heavy_imports = import_report.find_heavy_imports(import_report.measure_import_times("app"))
+
+    for module in ("gspread", "dropbox", "pymongo", "PyPDF2"):
+        assert module not in heavy_imports
+    assert heavy_imports == {}
@@ -0,0 +1,109 @@
+import os
+import json
+
+import pytest
+
+from ingestion import index_artifacts
+from ingestion.index_artifacts import (
+    ARTIFACT_MANIFEST_FILENAME, UnsafeIndexBuildError, artifact_build_lock, get_artifact_chroma_path,
+    get_artifact_path, get_current_version, hash_data_files, set_current_version, _check_publishable, _file_stats
+)
+from retrieval.retrieval_service import RetrievalService
+
+
+def publish_artifact(data_dir, index_dir, version):
+    """Stand-in for a real build: an artifact whose manifest lists data_dir's files"""
+    os.makedirs(get_artifact_chroma_path(index_dir, version))
+    with open(os.path.join(get_artifact_path(index_dir, version), ARTIFACT_MANIFEST_FILENAME), 'w') as f:
+        json.dump({"version": version, "files": hash_data_files(data_dir), "file_stats": _file_stats(data_dir)}, f)
+    set_current_version(index_dir, version)
+
+
+def boot(data_dir, index_dir, monkeypatch, builds):
+    """Run the startup check app.py does when an artifact has been published"""
+    def build_index_artifact(openai_client, openai_key, data_dir, index_dir, **kwargs):
+        version = f"v{len(builds) + 2}"
+        publish_artifact(data_dir, index_dir, version)
+        builds.append(version)
+        return version
+
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    monkeypatch.setattr(index_artifacts, "build_index_artifact", build_index_artifact)
+    service = RetrievalService()
+    service.config.update({"data_dir": str(data_dir), "index_dir": str(index_dir)})
+    monkeypatch.setattr(service, "swap_to_version", lambda version: setattr(service, "version", version))
+    return service.reindex_if_stale(openai_client=None)
+
+
+def test_file_edited_between_boots_is_reindexed(tmp_path, monkeypatch):
+    data_dir = tmp_path / "data"
+    index_dir = tmp_path / "index_artifacts"
+    data_dir.mkdir()
+    (data_dir / "faq.txt").write_text("Opening hours are 9 to 5.", encoding="utf-8")
+    publish_artifact(str(data_dir), str(index_dir), "v1")
+    builds = []
+
+    assert boot(data_dir, index_dir, monkeypatch, builds) is None
+    assert builds == []
+
+    # Edited while no process was running
+    (data_dir / "faq.txt").write_text("Opening hours are 8:30 to 6.", encoding="utf-8")
+
+    assert boot(data_dir, index_dir, monkeypatch, builds) == "v2"
+    assert builds == ["v2"]
+    assert get_current_version(str(index_dir)) == "v2"
+    assert boot(data_dir, index_dir, monkeypatch, builds) is None
+
+
+def test_file_added_between_boots_is_reindexed(tmp_path, monkeypatch):
+    data_dir = tmp_path / "data"
+    index_dir = tmp_path / "index_artifacts"
+    data_dir.mkdir()
+    (data_dir / "faq.txt").write_text("Opening hours are 9 to 5.", encoding="utf-8")
+    publish_artifact(str(data_dir), str(index_dir), "v1")
+    builds = []
+
+    (data_dir / "pricing.txt").write_text("Plans start at 10 EUR.", encoding="utf-8")
+
+    assert boot(data_dir, index_dir, monkeypatch, builds) == "v2"
+
+
+def test_unchanged_file_stats_skip_hashing(tmp_path, monkeypatch):
+    data_dir = tmp_path / "data"
+    index_dir = tmp_path / "index_artifacts"
+    data_dir.mkdir()
+    (data_dir / "faq.txt").write_text("Opening hours are 9 to 5.", encoding="utf-8")
+    publish_artifact(str(data_dir), str(index_dir), "v1")
+
+    def hash_data_files(data_dir):
+        raise AssertionError("contents hashed although file stats match")
+
+    monkeypatch.setattr(index_artifacts, "hash_data_files", hash_data_files)
+
+    assert boot(data_dir, index_dir, monkeypatch, []) is None
+
+
+def test_only_one_process_rebuilds(tmp_path, monkeypatch):
+    data_dir = tmp_path / "data"
+    index_dir = tmp_path / "index_artifacts"
+    data_dir.mkdir()
+    (data_dir / "faq.txt").write_text("Opening hours are 9 to 5.", encoding="utf-8")
+    publish_artifact(str(data_dir), str(index_dir), "v1")
+    (data_dir / "faq.txt").write_text("Opening hours are 8:30 to 6.", encoding="utf-8")
+    builds = []
+
+    # Another worker is building
+    with artifact_build_lock(str(index_dir)) as acquired:
+        assert acquired
+        assert boot(data_dir, index_dir, monkeypatch, builds) is None
+    assert builds == []
+
+
+def test_empty_or_shrunken_builds_are_not_published():
+    active_manifest = {"version": "v1", "files": {"faq.txt": "a", "pricing.txt": "b"}}
+
+    with pytest.raises(UnsafeIndexBuildError):
+        _check_publishable({"files": 0, "total_chunks": 0}, None)
+    with pytest.raises(UnsafeIndexBuildError):
+        _check_publishable({"files": 1, "total_chunks": 12}, active_manifest)
+    _check_publishable({"files": 2, "total_chunks": 20}, active_manifest)
@@ -0,0 +1,17 @@
+from prompt.prompt_assembler import extract_session_facts
+
+
+def order_ids(text):
+    return extract_session_facts({"messages": [{"role": "user", "content": text}]})["order_ids"]
+
+
+def test_order_ids_need_an_explicit_marker():
+    assert order_ids("My order number is SN-20431") == ["SN-20431"]
+    assert order_ids("order id: 88812") == ["88812"]
+    assert order_ids("What is the status of order #48213?") == ["48213"]
+    assert order_ids("order no. A1234") == ["A1234"]
+
+
+def test_measurements_after_order_are_not_order_ids():
+    assert order_ids("I want to order 1200mm wide letters") == []
+    assert order_ids("We'd like to order 2 signs, 36in each") == []
@@ -0,0 +1,35 @@
+from documents_processing_responses.text_chunker import (
+    split_text, approximate_token_count, CHUNK_SIZE_TOKENS
+)
+
+
+def test_long_hash_line_is_split_within_chunk_size():
+    text = "# " + "word " * 2000
+
+    chunks = split_text(text)
+
+    assert len(chunks) > 1
+    assert max(approximate_token_count(chunk) for chunk in chunks) <= CHUNK_SIZE_TOKENS
+    assert sum(chunk.split().count("word") for chunk in chunks) >= 2000
+
+
+def test_whitespace_free_run_is_hard_split_within_chunk_size():
+    url = "https://example.com/" + "a" * 5000
+    text = f"See {url} for details."
+
+    chunks = split_text(text)
+
+    assert len(chunks) > 1
+    assert max(approximate_token_count(chunk) for chunk in chunks) <= CHUNK_SIZE_TOKENS
+    assert "".join(chunks).count("a") >= url.count("a")
+    assert chunks[0].startswith("See")
+    assert chunks[-1].rstrip().endswith("for details.")
+
+
+def test_short_heading_stays_with_its_section():
+    text = "# Opening hours\nWe are open from 9 to 5 on weekdays."
+
+    chunks = split_text(text)
+
+    assert len(chunks) == 1
+    assert chunks[0].startswith("# Opening hours")